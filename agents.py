@@ -1,14 +1,80 @@
 import json
+import inspect
+import functools
 from datetime import date
 from enum import Enum
-from typing import Literal, Optional
+from typing import Literal, Optional, Type, List, Dict, Tuple, Callable, Any
 
 from pydantic import BaseModel
-from openai import OpenAI
+from openai.lib._parsing._completions import type_to_response_format_param
 from decouple import config
 
+import llm
+from sports import SPORTS
+from cache import LLMCache
 
-client = OpenAI(api_key=config('OPENAI_API_KEY'))
+
+def agent(version: int, schema: Type[BaseModel] | None = None):
+    """ Turn a request builder into a cached, rate-limited agent
+
+        The decorated function returns (request, parse); the agent sends the
+        request (sync, or `await agent.acall(...)`) and caches parse(response)
+        in LLMCache by (function, model, prompt, version). Bump version
+        whenever the prompt or the response schema changes. Answers from
+        the fallback model (llm.fallback, LLM_FALLBACK_<FUNCTION>) are
+        returned but not cached.
+
+        Backend and model come from llm.route(function name): the builder's
+        default model unless LLM_MODEL_<FUNCTION> or an explicit model says
+        otherwise.
+    """
+    def decorator(build: Callable[..., Tuple[Dict[str, Any], Callable]]):
+        name = build.__name__
+        default_model = inspect.signature(build).parameters['model'].default
+
+        def lookup(content: str, model: Optional[str] = None):
+            backend, model = llm.route(name, model, default_model)
+            hit = LLMCache.open().get(LLMCache.key(name, backend.tag(model), content, version))
+            if hit is None:
+                return None
+            return schema.model_validate_json(hit) if schema else json.loads(hit)
+
+        def store(content: str, result, model: Optional[str] = None):
+            backend, model = llm.route(name, model, default_model)
+            response = result.model_dump_json() if schema else json.dumps(result, ensure_ascii=False)
+            LLMCache.open().put(LLMCache.key(name, backend.tag(model), content, version), name, backend.tag(model), response)
+
+        @functools.wraps(build)
+        def wrapper(content: str, model: Optional[str] = None):
+            if (hit := lookup(content, model)) is not None:
+                return hit
+            backend, model = llm.route(name, model, default_model)
+            request, parse = build(content, model)
+            response, used = llm.complete(backend, name, request)
+            result = parse(response)
+            if backend.cache and used == request['model']:
+                store(content, result, model)
+            return result
+
+        async def acall(content: str, model: Optional[str] = None):
+            if (hit := lookup(content, model)) is not None:
+                return hit
+            backend, model = llm.route(name, model, default_model)
+            request, parse = build(content, model)
+            response, used = await llm.acomplete(backend, name, request)
+            result = parse(response)
+            if backend.cache and used == request['model']:
+                store(content, result, model)
+            return result
+
+        # Batched paths answer many prompts at once and share the same entries
+        wrapper.lookup, wrapper.store, wrapper.acall = lookup, store, acall
+        return wrapper
+    return decorator
+
+
+def _parsed(response):
+    return response.choices[0].message.parsed
 
 parse_location_tool = {
     "type": "function",
@@ -37,8 +103,9 @@ parse_location_tool = {
 }
 
 
+@agent(version=1)
 def normalize_location(location_raw: str, model: str = "gpt-4.1-mini"):
-    response = client.chat.completions.create(
+    request = dict(
         model=model,
         max_tokens=40,
         messages=[
@@ -62,49 +129,14 @@ def normalize_location(location_raw: str, model: str = "gpt-4.1-mini"):
         tool_choice={"type": "function", "function": {"name": "parse_location"}},
     )
 
-    message = response.choices[0].message
-    if not getattr(message, "tool_calls"):
-        return {'address': None, 'city': None, 'uf': None, 'confidence': 'low'}
-
-    print('normalize_location:', model, response.usage)
-    return json.loads(message.tool_calls[0].function.arguments)
-
-
-
-SPORTS = {
-    # Ciclismo
-    'Pedal':                'Ciclismo',
-    'Ciclismo':             'Ciclismo',
-    'Ciclismo de Estrada':  'Ciclismo',
-    # Mountain bike
-    'Mountain bike':        'Mountain bike',
-    'Mountain Bike':        'Mountain bike',
-    'MTB':                  'Mountain bike',
-    'XCM':                  'Mountain bike',
-    'XCO':                  'Mountain bike',
-    # Triathlon
-    'Cross Triathlon':      'Cross Triathlon',
-    'X-Triathlon':          'Cross Triathlon',
-    'Triathlon':            'Triathlon',
-    'Triatlhon':            'Triathlon',
-    'Triatlo':              'Triathlon',
-    'Duathlon':             'Triathlon',
-    'Duatlhon':             'Triathlon',
-    # Natação:
-    'Aquathon':             'Triathlon',
-    'Natação':              'Natação',
-    # Trail running
-    'Trail running':        'Trail running',
-    'Trail Run':            'Trail running',
-    'Corrida Trail':        'Trail running',
-    'Corrida de Montanha':  'Trail running',
-    # Corrida de Rua
-    'Corrida de Rua':       'Corrida de Rua',
-    'Corrida':              'Corrida de Rua',
-    # Cross Duathlon
-    'Cross Duathlon':       'Cross Duathlon',
-    'X-Duathlon':           'Cross Duathlon',
-}
+    def parse(response):
+        message = response.choices[0].message
+        if not getattr(message, "tool_calls"):
+            return {'address': None, 'city': None, 'uf': None, 'confidence': 'low'}
+        return json.loads(message.tool_calls[0].function.arguments)
+
+    return request, parse
+
 
 _CANONICAL_SPORTS = Enum('Sport', {v: v for v in dict.fromkeys(SPORTS.values())})
 
@@ -113,9 +145,9 @@ class _SportClassification(BaseModel):
     sport: Optional[str] = None
     confidence: Literal['low', 'high'] = 'low'
 
-def classify_sport(content: str, model: str = 'gpt-5.4-mini') -> _SportClassification:
-    model = 'gpt-5.4-mini'
-    resp = client.beta.chat.completions.parse(
+@agent(version=1, schema=_SportClassification)
+def classify_sport(content: str, model: str = 'gpt-5.4-mini'):
+    request = dict(
         model=model,
         temperature=0,
         #max_tokens=20,
@@ -133,15 +165,14 @@ def classify_sport(content: str, model: str = 'gpt-5.4-mini') -> _SportClassific
         ],
         response_format=_SportClassification,
     )
-
-    print('classify_sport:', model, resp.usage)
-    return resp.choices[0].message.parsed
+    return request, _parsed
 
 
 def search_classify_sport(title: str, url: str) -> _SportClassification:
     # Step 1: web search — title and url only
-    response = client.chat.completions.create(
-        model="gpt-4o-mini-search-preview",
+    backend, model = llm.route('search_classify_sport', default="gpt-4o-mini-search-preview")
+    response = backend.client().chat.completions.create(
+        model=model,
         messages=[{"role": "user", "content": f"{title} {url}"}],
     )
     print(response.usage)
@@ -152,8 +183,9 @@ def search_classify_sport(title: str, url: str) -> _SportClassification:
 
 
 def search_event_location(event_title: str) -> str:
-    response = client.chat.completions.create(
-        model="gpt-4o-mini-search-preview",
+    backend, model = llm.route('search_event_location', default="gpt-4o-mini-search-preview")
+    response = backend.client().chat.completions.create(
+        model=model,
         messages=[{
             "role": "user",
             "content": (
@@ -162,7 +194,7 @@ def search_event_location(event_title: str) -> str:
             )
         }]
     )
-    print('search_event_location', "gpt-4o-mini-search-preview", response.usage)
+    print('search_event_location', model, response.usage)
     return response.choices[0].message.content or ""
 
 
@@ -172,8 +204,9 @@ class DateRange(BaseModel):
     end_date: Optional[date] = None
 
 
+@agent(version=1, schema=DateRange)
 def normalize_daterange(date_raw: str, model: str = "gpt-4.1-nano"):
-    resp = client.beta.chat.completions.parse(
+    request = dict(
         model=model,
         temperature=0,
         max_tokens=30,
@@ -193,8 +226,186 @@ def normalize_daterange(date_raw: str, model: str = "gpt-4.1-nano"):
         ],
         response_format=DateRange,
     )
-    print('normalize_daterange:', model, resp.usage)
-    return resp.choices[0].message.parsed
+    return request, _parsed
+
+_UF = Literal[
+    "AC","AL","AP","AM","BA","CE","DF","ES","GO","MA",
+    "MT","MS","MG","PA","PB","PR","PE","PI","RJ","RN",
+    "RS","RO","RR","SC","SP","SE","TO",
+]
+
+
+class _EventNormalization(BaseModel):
+    multi_day: Optional[bool] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    address: Optional[str] = None
+    city: Optional[str] = None
+    uf: Optional[_UF] = None
+    location_confidence: Literal['low', 'high'] = 'low'
+    sport: Optional[str] = None
+    sport_confidence: Literal['low', 'high'] = 'low'
+
+
+EVENT_PROMPT = (
+    "Normalize a Brazilian sports event.\n"
+    "Date → YYYY-MM-DD:\n"
+    "- single day → multi_day=false\n"
+    "- range → set start_date + end_date\n"
+    "- missing/invalid → all null\n"
+    "- ignore time\n"
+    "Location → address, city, uf:\n"
+    "- Event name → all null\n"
+    "- Place/venue → fill address\n"
+    "- Always infer uf from city (Brazil)\n"
+    "- If unsure city/uf → location_confidence=low\n"
+    "- ALL CAPS / all lowercase → Title Case\n"
+    "- Unknown → null\n"
+    "Sport:\n"
+    f"- Classes: {', '.join(e.value for e in _CANONICAL_SPORTS)}\n"
+    "- Unknown → null\n"
+    "- Uncertain → sport_confidence=low"
+)
+
+
+@agent(version=1, schema=_EventNormalization)
+def normalize_event(content: str, model: str = 'gpt-5.4-mini'):
+    """ Date range, location and sport in one call, for events missing more than one """
+    request = dict(
+        model=model,
+        temperature=0,
+        messages=[
+            {"role": "system", "content": EVENT_PROMPT},
+            {"role": "user", "content": content},
+        ],
+        response_format=_EventNormalization,
+    )
+    return request, _parsed
+
+
+class _IndexedEvent(_EventNormalization):
+    index: int
+
+
+class _EventBatch(BaseModel):
+    results: List[_IndexedEvent]
+
+
+EVENTS_BATCH_SIZE = config('LLM_BATCH_SIZE', default=25, cast=int)
+
+
+def _events_request(contents: List[str], missing: List[int], model: str) -> Dict[str, Any]:
+    return dict(
+        model=model,
+        temperature=0,
+        messages=[
+            {
+                "role": "system",
+                "content": EVENT_PROMPT + "\nInput: JSON list of {index, event}. Answer every index once.",
+            },
+            {
+                "role": "user",
+                "content": json.dumps([{'index': i, 'event': contents[i]} for i in missing], ensure_ascii=False),
+            },
+        ],
+        response_format=_EventBatch,
+    )
+
+
+def _events_results(contents, results, missing, response, model, cache=True) -> List[Optional[_EventNormalization]]:
+    for item in _parsed(response).results:
+        if item.index in missing and results[item.index] is None:
+            result = _EventNormalization(**item.model_dump(exclude={'index'}))
+            if cache:
+                normalize_event.store(contents[item.index], result, model)
+            results[item.index] = result
+    return results
+
+
+def normalize_events(contents: List[str], model: Optional[str] = None) -> List[Optional[_EventNormalization]]:
+    """ normalize_event for up to EVENTS_BATCH_SIZE events in one request
+
+        Answers come back keyed by index; an event the model skipped is None.
+        Cached per event, under the same entries (and routing) as normalize_event.
+    """
+    backend, model = llm.route('normalize_event', model, 'gpt-5.4-mini')
+    results = [normalize_event.lookup(c, model) for c in contents]
+    missing = [i for i, r in enumerate(results) if r is None]
+    if not missing:
+        return results
+    response, used = llm.complete(backend, 'normalize_events', _events_request(contents, missing, model))
+    return _events_results(contents, results, missing, response, model, cache=backend.cache and used == model)
+
+
+async def anormalize_events(contents: List[str], model: Optional[str] = None) -> List[Optional[_EventNormalization]]:
+    backend, model = llm.route('normalize_event', model, 'gpt-5.4-mini')
+    results = [normalize_event.lookup(c, model) for c in contents]
+    missing = [i for i, r in enumerate(results) if r is None]
+    if not missing:
+        return results
+    response, used = await llm.acomplete(backend, 'normalize_events', _events_request(contents, missing, model))
+    return _events_results(contents, results, missing, response, model, cache=backend.cache and used == model)
+
+
+def submit_event_batch(contents: Dict[str, str], model: Optional[str] = None) -> Optional[str]:
+    """ Offline path: one Batch API job for a whole backlog, {custom_id: content}
+
+        Half the price, answered within 24h; collect_event_batch() puts the
+        answers in the normalize_event cache. Returns the batch id. OpenAI
+        only: with normalize_event routed elsewhere nothing is submitted.
+    """
+    backend, model = llm.route('normalize_event', model, 'gpt-5.4-mini')
+    if backend.name != 'openai':
+        print('submit_event_batch: normalize_event runs on', backend.name, '- no Batch API')
+        return None
+    pending = {cid: c for cid, c in contents.items() if normalize_event.lookup(c, model) is None}
+    if not pending:
+        return None
+    lines = [
+        json.dumps({
+            'custom_id': cid,
+            'method': 'POST',
+            'url': '/v1/chat/completions',
+            'body': {
+                'model': model,
+                'temperature': 0,
+                'messages': [
+                    {"role": "system", "content": EVENT_PROMPT},
+                    {"role": "user", "content": content},
+                ],
+                'response_format': type_to_response_format_param(_EventNormalization),
+            },
+        }, ensure_ascii=False)
+        for cid, content in pending.items()
+    ]
+    client = backend.client()
+    batch_file = client.files.create(
+        file=('normalize_event.jsonl', '\n'.join(lines).encode()), purpose='batch')
+    batch = client.batches.create(
+        input_file_id=batch_file.id, endpoint='/v1/chat/completions', completion_window='24h')
+    print('submit_event_batch:', model, len(lines), batch.id)
+    return batch.id
+
+
+def collect_event_batch(batch_id: str, contents: Dict[str, str], model: Optional[str] = None) -> Optional[int]:
+    """ Cache the answers of a finished batch; None while it is still running """
+    client = llm.BACKENDS['openai'].client()
+    batch = client.batches.retrieve(batch_id)
+    if batch.status != 'completed':
+        print('collect_event_batch:', batch_id, batch.status, batch.request_counts)
+        return None if batch.status in ('validating', 'in_progress', 'finalizing') else 0
+
+    count = 0
+    for line in client.files.content(batch.output_file_id).text.splitlines():
+        row = json.loads(line)
+        body = (row.get('response') or {}).get('body') or {}
+        if row['custom_id'] not in contents or not body.get('choices'):
+            continue
+        result = _EventNormalization.model_validate_json(body['choices'][0]['message']['content'])
+        normalize_event.store(contents[row['custom_id']], result, model)
+        count += 1
+    print('collect_event_batch:', batch_id, count, 'answers')
+    return count
 
 if __name__ == '__main__':
 
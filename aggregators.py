@@ -1,15 +1,15 @@
 import re
 import json
-import time
 from pathlib import Path
 from datetime import datetime
 from urllib.parse import urljoin
 from collections import OrderedDict
 
+import lxml.html
 from bs4 import BeautifulSoup
-from curl_cffi import requests as cf_requests
 
-from bronze import Crawler, Extractor
+from bronze import Crawler, Extractor, strainer, has_class
+from dates import parse_date
 
 
 class ConfederacaoBrasileira:
@@ -118,6 +118,7 @@ class TicketSports(Crawler, Extractor):
         'Category': 'Agregador',
         'DDD': '11',
     }
+    PARSE_ONLY = strainer('div', 'card-evento')
 
     def title(self, soup) -> str:
         return soup.find('h1').text.strip()
@@ -136,38 +137,22 @@ class TicketSports(Crawler, Extractor):
 
     def trigger(self):
         endpoint = urljoin(self.URL, 'Calendario/Todos-os-organizadores/Ciclismo,Mountain-bike/Todo-o-Brasil/Todas-as-cidades/0,00/0,00/false/?termo=&periodo=0&mes=&inicio=&fim=&ordenacao=3&pais=')
-        fp, soup = self.get_html(endpoint, suffix='calendario')
+        fp, soup = self.get_html(endpoint, suffix='calendario', parse_only=self.PARSE_ONLY)
         div = soup.find_all('div', 'card-evento')
 
-        href_list = []
+        pages = []
         for d in div:
             href = d.find('a').get('href')
-            href_list.append(href)
-
-        events_acc = []
-        for href in href_list:
-            url = urljoin(self.URL, href)
-            fn = re.sub(r'(?u)[^-\w.]', '_', href)
-            fp, soup2 = self.get_html(url, suffix=fn)
-            events_acc.append(self.parse(soup2, fp))
+            pages.append((urljoin(self.URL, href), re.sub(r'(?u)[^-\w.]', '_', href), str(d)))
 
-        return events_acc
+        for fp, soup2 in self.get_details(pages):
+            yield self.parse(soup2, fp)
 
 
 class TicketSportsAPI(Crawler, Extractor):
     URL = 'https://www.ticketsports.com.br/'
     REPO = Path('api.ticketsports.com.br')
-
-    @staticmethod
-    def _call(method_f, endpoint, params={}, payload={}, crawl_delay=1):
-        time.sleep(crawl_delay)
-        session = cf_requests.Session(impersonate='chrome120')
-        kwargs = {}
-        if params:
-            kwargs['params'] = params
-        if payload:
-            kwargs['data'] = json.dumps(payload)
-        return getattr(session, method_f.__name__)(endpoint, **kwargs)
+    IMPERSONATE = 'chrome120'
 
     META = {
         'Category': 'Agregador',
@@ -208,7 +193,6 @@ class TicketSportsAPI(Crawler, Extractor):
         }
 
         page = 1
-        events_acc = []
         ids_set = OrderedDict()
         api = urljoin(self.URL, 'Calendario')
 
@@ -216,23 +200,15 @@ class TicketSportsAPI(Crawler, Extractor):
             fp, data = self.get_json(api, suffix=f'calendario{page}.json', payload=payload())
             if not data:
                 break
-            events_acc += [self.parse(row, fp) for row in data]
+            yield from (self.parse(row, fp) for row in data)
             ids_set |= {obj['IdEvento']:'' for obj in data if 'IdEvento' in obj}
             page += 1
 
-        return events_acc
-
 
 class TicketSportsAPI2(Crawler, Extractor):
     URL = 'https://www.ticketsports.com.br/'
     REPO = Path('api.ticketsports.com.br')
-
-    @staticmethod
-    def _call(method_f, endpoint, params={}, payload={}, crawl_delay=1):
-        time.sleep(crawl_delay)
-        session = cf_requests.Session(impersonate='chrome120')
-        kwargs = {'params': params} if params else {}
-        return session.get(endpoint, **kwargs)
+    IMPERSONATE = 'chrome120'
 
     META = {
         'Category': 'Agregador',
@@ -253,34 +229,33 @@ class TicketSportsAPI2(Crawler, Extractor):
 
     QUICK_FILTERS = ['mountain-bike', 'ciclismo', 'triathlon']
 
-    def trigger(self):
-        QUANTITY = 200
-        events_acc = []
-        seen = set()
+    QUANTITY = 200
+
+    async def _page(self, qf, page):
+        params = {
+            'quantity': self.QUANTITY,
+            'atlheteId': 0,
+            'quickFilter': qf,
+            'country': 'BR',
+            'page': page,
+        }
         api = urljoin(self.URL, 'api/events/list')
+        return await self.aget_json(api, suffix=f'events-{qf}-{page}.json', params=params)
 
-        for qf in self.QUICK_FILTERS:
-            page = 1
-            while True:
-                params = {
-                    'quantity': QUANTITY,
-                    'atlheteId': 0,
-                    'quickFilter': qf,
-                    'country': 'BR',
-                    'page': page,
-                }
-                fp, data = self.get_json(api, suffix=f'events-{qf}-{page}.json', params=params)
-                if not data:
-                    break
-                for row in data:
+    def trigger(self):
+        # Quick filters are paged concurrently; events overlap between them
+        is_last = lambda data: len(data or []) < self.QUANTITY
+        by_filter = self.gather([
+            self.apaginate(lambda page, qf=qf: self._page(qf, page), is_last)
+            for qf in self.QUICK_FILTERS
+        ])
+        seen = set()
+        for pages in by_filter:
+            for fp, data in pages:
+                for row in data or []:
                     if row['eventId'] not in seen:
                         seen.add(row['eventId'])
-                        events_acc.append(self.parse(row, fp))
-                if len(data) < QUANTITY:
-                    break
-                page += 1
-
-        return events_acc
+                        yield self.parse(row, fp)
 
 
 
@@ -321,17 +296,14 @@ class TourDoPeixe(Crawler, Extractor):
         fp, soup = self.get_html(endpoint, suffix='calendario')
         tr = soup.find('table').find_all('tr')
 
-        events_acc = []
         for i, t in enumerate(tr):
             if not i:
                 continue # header
             try:
-                events_acc.append(self.parse(t, fp))
+                yield self.parse(t, fp)
             except ValueError as ve:
                 continue
 
-        return events_acc
-
 
 class InscricoesBike(Crawler, Extractor):
     URL = 'https://inscricoes.bike/'
@@ -357,11 +329,8 @@ class InscricoesBike(Crawler, Extractor):
         api = 'https://static.inscricoes.bike/eventos/eventos-bike.json'
         fp, data = self.get_json(api, suffix='eventos.json')
 
-        events_acc = []
         for row in data:
-            events_acc.append(self.parse(row, fp))
-
-        return events_acc
+            yield self.parse(row, fp)
 
 
 class Atletis(Crawler, Extractor):
@@ -371,68 +340,59 @@ class Atletis(Crawler, Extractor):
         'Category': 'Agregador',
     }
 
-    def title(self, soup) -> str:
-        return soup['data-name'].strip()
+    # Listing and detail pages go through the lxml backend: Atletis is the
+    # highest-volume paginated source and only a few attributes are read
 
-    def date(self, soup) -> str:
-        return soup['data-date'].strip()
+    def title(self, node) -> str:
+        return node.get('data-name').strip()
 
-    def local(self, soup) -> str:
-        infos = soup.find('div', class_='event-card').find_all('div', class_='event-card-info')
+    def date(self, node) -> str:
+        return node.get('data-date').strip()
+
+    def local(self, node) -> str:
+        card = node.xpath(f'.//div[{has_class("event-card")}]')[0]
+        infos = card.xpath(f'.//div[{has_class("event-card-info")}]')
         if len(infos) >= 2:
-            return infos[1].get_text(strip=True)
+            return ''.join(t.strip() for t in infos[1].itertext())
         return ''
 
-    def url(self, soup) -> str:
-        return soup['data-url']
+    def url(self, node) -> str:
+        return node.get('data-url')
 
-    def sport(self, soup) -> str:
-        script = soup.find('script', type='application/ld+json')
+    def sport(self, node) -> str:
+        script = node.xpath('.//script[@type="application/ld+json"]')
         if not script:
             return ''
-        _sport = json.loads(script.string).get('sport', '')
+        _sport = json.loads(script[0].text).get('sport', '')
         return _sport
 
-    @staticmethod
-    def _parse_date(raw: str):
-        import locale
-        from datetime import datetime
-        locale.setlocale(locale.LC_TIME, 'pt_BR.UTF-8')
-        try:
-            return datetime.strptime(raw.strip(), "%d %B %Y").date()
-        except ValueError:
-            return None
+    def _future(self, tree):
+        return [
+            div for div in tree.xpath('//div[@data-event]')
+            if (d := parse_date(div.get('data-date'))) and d >= self.today()
+        ]
 
-    def trigger(self):
-        from datetime import date as date_t
-        events = []
-        page = 1
-        while True:
-            endpoint = (
-                urljoin(self.URL, 'eventos') if page == 1
-                else urljoin(self.URL, f'eventos/{page}')
-            )
-            fp, soup = self.get_html(endpoint, suffix=f'eventos-p{page}.html')
-            event_divs = soup.find_all('div', attrs={'data-event': True})
-            if not event_divs:
-                break
+    def _is_last(self, tree) -> bool:
+        return not self._future(tree) or not tree.xpath(f'//a[{has_class("pagination-next")}]')
 
-            future_divs = [
-                div for div in event_divs
-                if (d := self._parse_date(div['data-date'])) and d >= date_t.today()
-            ]
-            if not future_divs:
-                break
+    async def _page(self, page):
+        endpoint = (
+            urljoin(self.URL, 'eventos') if page == 1
+            else urljoin(self.URL, f'eventos/{page}')
+        )
+        return await self.aget_tree(endpoint, suffix=f'eventos-p{page}.html')
+
+    def trigger(self):
+        for fp, tree in self.paginate(self._page, self._is_last):
+            future_divs = self._future(tree)
 
+            pages = []
             for div in future_divs:
-                event_url = div['data-url']
+                event_url = div.get('data-url')
                 slug = event_url.rstrip('/').split('/')[-1]
-                fp2, detail = self.get_html(event_url, suffix=f'{slug}.html')
+                pages.append((event_url, f'{slug}.html', lxml.html.tostring(div, encoding='unicode')))
+
+            for div, (fp2, detail) in zip(future_divs, self.get_details(pages, tree=True)):
                 event = self.parse(div, fp)
                 event.sport = self.sport(detail)
-                events.append(event)
-
-            if not soup.find('a', class_='pagination-next'):
-                break
-            page += 1
-        return events
+                yield event
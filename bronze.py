@@ -1,12 +1,19 @@
+import io
 import os
+import re
 import time
+import hashlib
+import asyncio
+import threading
+import multiprocessing
 from pathlib import Path
 from itertools import chain
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
 from datetime import date, datetime, timedelta
 
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List, Optional, Iterator, Tuple
+from typing import Dict, Any, List, Optional, Iterator, Tuple, Iterable, Awaitable, Callable, Set
+from contextvars import ContextVar
 from dataclasses import dataclass, asdict
 
 import json
@@ -14,7 +21,14 @@ import requests
 import validators
 import jsonlines
 import pdfplumber
-from bs4 import BeautifulSoup
+from decouple import config
+from concurrent.futures import ProcessPoolExecutor
+import lxml.html
+from bs4 import BeautifulSoup, SoupStrainer
+from curl_cffi import CurlHttpVersion, requests as cf_requests
+
+from cache import Manifest, BlobStore
+from scheduler import HostScheduler
 
 
 @dataclass
@@ -66,10 +80,16 @@ class RawLayer:
         if not hasattr(self, 'REPO'):
             raise AttributeError("REPO must be defined in concrete class")
 
-        self._repo = self.BASE / self.REPO / 'raw'
+        self._repo = self.raw_dir()
         self._repo.mkdir(parents=True, exist_ok=True)
+        self._blobs = BlobStore.open(self._repo)
         super().__init__()
 
+    @property
+    def _manifest(self) -> Manifest:
+        # Opened (or rebuilt) on first use: replayed crawlers never touch it
+        return Manifest.open(self._repo)
+
     @staticmethod
     def _is_file_fresh(filepath, max_age_hours=23):
         if not filepath.exists():
@@ -77,89 +97,457 @@ class RawLayer:
         age = datetime.now() - datetime.fromtimestamp(filepath.stat().st_mtime)
         return age < timedelta(hours=max_age_hours)
 
+    @classmethod
+    def raw_dir(klass) -> Path:
+        return klass.BASE / klass.REPO / 'raw'
+
+    @classmethod
+    def archived_days(klass) -> List[date]:
+        days = set()
+        for fp in klass.raw_dir().iterdir():
+            if Manifest.RAW_NAME.match(fp.name):
+                days.add(date.fromisoformat(fp.name[:10]))
+        return sorted(days)
+
+    @classmethod
+    def archive(klass, day: date) -> Dict[str, Path]:
+        """ suffix (and key~suffix) -> newest raw file archived up to day """
+        archive = {}
+        for fp in sorted(klass.raw_dir().iterdir()):
+            if (m := Manifest.RAW_NAME.match(fp.name)) and fp.name[:10] <= day.isoformat():
+                archive[m['suffix']] = fp # sorted: newest wins
+                if m['key']:
+                    archive[f"{m['key']}~{m['suffix']}"] = fp
+        return archive
+
+    def write_raw(self, fn: Path, content: bytes) -> str:
+        return self._blobs.write(fn, content)
+
+    def read_raw(self, fn: Path) -> bytes:
+        return self._blobs.read(fn)
+
     def latest(self, glob='*.html'):
         return sorted(Path(self._repo).glob(glob),
                 key=os.path.getctime, reverse=True)
 
 
-class Crawler(ABC, RawLayer):
+def strainer(name: str, css_class: str) -> SoupStrainer:
+    """ SoupStrainer for one class of a (possibly multi-valued) class attribute """
+    return SoupStrainer(name, class_=re.compile(rf'(^|\s){re.escape(css_class)}(\s|$)'))
 
-    # TODO:
-    # set crawl_delay based on robots.txt
 
-    @staticmethod
-    def _call(method_f, endpoint, params={}, payload={}, crawl_delay=1):
-        time.sleep(crawl_delay)
-        kwargs = {
-            'headers': {
-                #'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64; rv:141.0) Gecko/20100101 Firefox/141.0',
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                #'Accept-Language': 'en-US,en;q=0.5',
-                'Accept-Language': 'pt-BR,en-US;q=0.8,en;q=0.6,pt;q=0.4',
-                'Accept-Encoding': 'gzip, deflate, br, zstd',
-                'Connection': 'keep-alive',
-                'Upgrade-Insecure-Requests': '1',
-                'Sec-Fetch-Dest': 'document',
-                'Sec-Fetch-Mode': 'navigate',
-                'Sec-Fetch-Site': 'cross-site',
-                'Priority': 'u=0, i',
-                #'Pragma': 'no-cache',
-                #'Cache-Control': 'no-cache'
-            },
-        }
+def has_class(css_class: str) -> str:
+    """ XPath predicate, the lxml counterpart of strainer() """
+    return f'contains(concat(" ", normalize-space(@class), " "), " {css_class} ")'
+
+
+class SessionPool:
+    """ Long-lived keep-alive sessions, one per host (and per thread) """
+
+    _local = threading.local()
+
+    @classmethod
+    def get(klass, endpoint: str, impersonate: str | None = None):
+        sessions = klass._local.__dict__.setdefault('sessions', {})
+        key = (urlparse(endpoint).netloc, impersonate)
+        if key not in sessions:
+            sessions[key] = (
+                cf_requests.Session(impersonate=impersonate)
+                if impersonate else requests.Session()
+            )
+        return sessions[key]
+
+
+class AsyncSessionPool:
+    """ Per-host AsyncSessions living for the duration of one event loop """
+
+    _current: ContextVar['AsyncSessionPool'] = ContextVar('async_session_pool')
+
+    def __init__(self):
+        self._sessions = {}
+
+    async def __aenter__(self):
+        self._token = self._current.set(self)
+        return self
+
+    async def __aexit__(self, *exc):
+        self._current.reset(self._token)
+        for session in self._sessions.values():
+            await session.close()
+
+    @classmethod
+    def get(klass, endpoint: str, impersonate: str | None = None):
+        pool = klass._current.get()
+        key = (urlparse(endpoint).netloc, impersonate)
+        if key not in pool._sessions:
+            # HTTP/2 over TLS when the server offers it via ALPN, else HTTP/1.1
+            pool._sessions[key] = cf_requests.AsyncSession(
+                impersonate=impersonate, http_version=CurlHttpVersion.V2TLS)
+        return pool._sessions[key]
+
+
+class Crawler(ABC, RawLayer):
+
+    # Browser fingerprint for curl_cffi; None means plain requests + HEADERS
+    IMPERSONATE: str | None = None
+    TIMEOUT: float | None = None
+
+    # Subtree of the listing page the extractors read; the rest is never built
+    PARSE_ONLY: SoupStrainer | None = None
+
+    # Incremental: detail pages whose listing entry is unchanged are read from
+    # the archive; REFRESH_FRACTION of them are re-fetched anyway on each run
+    INCREMENTAL = config('CRAWL_INCREMENTAL', default=True, cast=bool)
+    REFRESH_FRACTION = config('CRAWL_REFRESH_FRACTION', default=0.1, cast=float)
+
+    # Paged sources: pages fetched concurrently per round-trip by paginate()
+    PAGE_WINDOW = config('CRAWL_PAGE_WINDOW', default=4, cast=int)
+
+    # Processes sharing the table extraction of one PDF, each with at least
+    # PDF_PAGES_PER_WORKER pages: short PDFs are read in-process
+    PDF_WORKERS = config('PDF_WORKERS', default=min(4, os.cpu_count() or 1), cast=int)
+    PDF_PAGES_PER_WORKER = config('PDF_PAGES_PER_WORKER', default=8, cast=int)
+
+    # Set by replay(): serve every request from the archive as of that day
+    _replay_day: date | None = None
+
+    HEADERS = {
+        #'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64; rv:141.0) Gecko/20100101 Firefox/141.0',
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+        #'Accept-Language': 'en-US,en;q=0.5',
+        'Accept-Language': 'pt-BR,en-US;q=0.8,en;q=0.6,pt;q=0.4',
+        'Accept-Encoding': 'gzip, deflate, br, zstd',
+        'Connection': 'keep-alive',
+        'Upgrade-Insecure-Requests': '1',
+        'Sec-Fetch-Dest': 'document',
+        'Sec-Fetch-Mode': 'navigate',
+        'Sec-Fetch-Site': 'cross-site',
+        'Priority': 'u=0, i',
+        #'Pragma': 'no-cache',
+        #'Cache-Control': 'no-cache'
+    }
+
+    def _request_kwargs(self, params={}, payload={}, headers={}) -> Dict[str, Any]:
+        kwargs = {}
+        if not self.IMPERSONATE:
+            kwargs['headers'] = self.HEADERS | headers
+        elif headers:
+            kwargs['headers'] = headers
+        kwargs.update({'timeout': self.TIMEOUT}) if self.TIMEOUT else None
         kwargs.update({'params': params}) if params else None
         kwargs.update({'data': json.dumps(payload)}) if payload else None
-        return method_f(endpoint, **kwargs)
+        return kwargs
+
+    # Throttled (429/503) or failed requests are retried after backing off
+    MAX_RETRIES = 4
+
+    def _call(self, method_f, endpoint, params={}, payload={}, headers={}):
+        session = SessionPool.get(endpoint, self.IMPERSONATE)
+        kwargs = self._request_kwargs(params, payload, headers)
+        for attempt in range(self.MAX_RETRIES + 1):
+            HostScheduler.wait(endpoint, self.IMPERSONATE, self._request_kwargs().get('headers'))
+            start = time.monotonic()
+            try:
+                response = session.request(method_f.__name__.upper(), endpoint, **kwargs)
+            except OSError:
+                if not HostScheduler.observe(endpoint, None, time.monotonic() - start) or attempt == self.MAX_RETRIES:
+                    raise
+                continue
+            retry = HostScheduler.observe(endpoint, response.status_code, time.monotonic() - start,
+                                          response.headers.get('Retry-After'))
+            if not retry:
+                break
+        return response
+
+    async def _acall(self, method, endpoint, params={}, payload={}, headers={}):
+        # robots.txt fetch is blocking
+        await asyncio.to_thread(HostScheduler.check, endpoint, self.IMPERSONATE, self._request_kwargs().get('headers'))
+        session = AsyncSessionPool.get(endpoint, self.IMPERSONATE)
+        kwargs = self._request_kwargs(params, payload, headers)
+        if 'headers' in kwargs:
+            # libcurl negotiates and decodes the encodings it supports itself
+            kwargs['headers'] = {k: v for k, v in kwargs['headers'].items() if k != 'Accept-Encoding'}
+        for attempt in range(self.MAX_RETRIES + 1):
+            await asyncio.sleep(HostScheduler.reserve(endpoint))
+            start = time.monotonic()
+            try:
+                response = await session.request(method, endpoint, **kwargs)
+            except OSError:
+                if not HostScheduler.observe(endpoint, None, time.monotonic() - start) or attempt == self.MAX_RETRIES:
+                    raise
+                continue
+            retry = HostScheduler.observe(endpoint, response.status_code, time.monotonic() - start,
+                                          response.headers.get('Retry-After'))
+            if not retry:
+                break
+        return response
+
+    def _lookup(self, key, suffix) -> Tuple[Optional[Path], Optional[Dict]]:
+        """ Fresh hit -> (file, entry); stale or unknown -> (None, entry) """
+        entry = self._manifest.get(key, suffix)
+        if entry and self._manifest.is_fresh(entry):
+            fn = self._manifest.path(entry)
+            print(f'Reading from: {fn}')
+            return fn, entry
+        return None, entry
+
+    def _store(self, key, suffix, response, entry) -> Path:
+        if response.status_code == 304 and entry:
+            fn = self._manifest.path(entry)
+            print(f'Not modified: {fn}')
+            self._manifest.revalidated(key, suffix)
+            return fn
+
+        response.raise_for_status()
+        fn = self._repo / Manifest.raw_name(date.today().isoformat(), key, suffix)
+        self.write_raw(fn, response.content)
+        self._manifest.put(key, suffix, fn, response.content, response.headers)
+        return fn
+
+    def replay(self, day: date, archive: Dict[str, Path] | None = None):
+        """ Offline mode: no network, pages come from the archive as of `day` """
+        self._replay_day = day
+        self._archive = self.archive(day) if archive is None else archive
+
+    def today(self) -> date:
+        return self._replay_day or date.today()
 
+    def _archived(self, suffix, key: str | None = None) -> Path:
+        """ The file of this very request if archived under its key, else the newest for the suffix """
+        if key and (fp := self._archive.get(f'{key[:Manifest.KEY_CHARS]}~{suffix}')):
+            return fp
+        if suffix not in self._archive:
+            raise FileNotFoundError(f'{suffix} not archived in {self._repo} up to {self._replay_day}')
+        return self._archive[suffix]
 
     def download(self, url, suffix, method_f=requests.get, **kwargs) -> Path:
+        key = Manifest.key(method_f.__name__, url, kwargs.get('params'), kwargs.get('payload'))
+        if self._replay_day:
+            return self._archived(suffix, key)
 
         # Cached
-        latest = self.latest(glob=f'*{suffix}')
-        if latest:
-            last = max(latest)
-            if self._is_file_fresh(last):
-                print(f'Reading from: {last}')
-                return last
+        fn, entry = self._lookup(key, suffix)
+        if fn:
+            return fn
 
         print(f'Requesting {url}')
-        response = self._call(method_f, url, **kwargs)
-        response.raise_for_status()
+        headers = Manifest.conditional_headers(entry)
+        response = self._call(method_f, url, headers=headers, **kwargs)
+        return self._store(key, suffix, response, entry)
 
-        today = date.today().isoformat()
-        fn = self._repo / f'{today}-{suffix}'
-        fn.write_bytes(response.content)
-        return fn
+    async def adownload(self, url, suffix, method='GET', **kwargs) -> Path:
+        key = Manifest.key(method, url, kwargs.get('params'), kwargs.get('payload'))
+        if self._replay_day:
+            return self._archived(suffix, key)
+
+        # Cached
+        fn, entry = self._lookup(key, suffix)
+        if fn:
+            return fn
+
+        print(f'Requesting {url}')
+        headers = Manifest.conditional_headers(entry)
+        response = await self._acall(method, url, headers=headers, **kwargs)
+        return self._store(key, suffix, response, entry)
+
+    def _text(self, fn: Path, encoding: str | None) -> str:
+        return self.read_raw(fn).decode(encoding or 'utf-8', errors='ignore')
+
+    def _soup(self, fn: Path, encoding: str | None, parse_only: SoupStrainer | None = None) -> BeautifulSoup:
+        return BeautifulSoup(self._text(fn, encoding), "lxml", parse_only=parse_only)
 
     def get_html(self,
             url: str,
             suffix: str ='home.html',
-            encoding: str | None = 'utf-8') -> Tuple[Path, BeautifulSoup]:
+            encoding: str | None = 'utf-8',
+            parse_only: SoupStrainer | None = None) -> Tuple[Path, BeautifulSoup]:
         fn = self.download(url, suffix)
-        html = fn.read_text(encoding=encoding, errors='ignore')
-        return fn, BeautifulSoup(html, "lxml")
+        return fn, self._soup(fn, encoding, parse_only)
+
+    async def aget_html(self,
+            url: str,
+            suffix: str ='home.html',
+            encoding: str | None = 'utf-8',
+            parse_only: SoupStrainer | None = None) -> Tuple[Path, BeautifulSoup]:
+        fn = await self.adownload(url, suffix)
+        return fn, self._soup(fn, encoding, parse_only)
+
+    def get_tree(self,
+            url: str,
+            suffix: str ='home.html',
+            encoding: str | None = 'utf-8') -> Tuple[Path, lxml.html.HtmlElement]:
+        """ lxml/XPath backend: no BeautifulSoup tree at all, for high-volume pages """
+        fn = self.download(url, suffix)
+        return fn, lxml.html.fromstring(self._text(fn, encoding))
+
+    async def aget_tree(self,
+            url: str,
+            suffix: str ='home.html',
+            encoding: str | None = 'utf-8') -> Tuple[Path, lxml.html.HtmlElement]:
+        fn = await self.adownload(url, suffix)
+        return fn, lxml.html.fromstring(self._text(fn, encoding))
 
     def get_pdf(self, url, suffix='doc.pdf') -> Tuple[Path, List]:
+        """ Table rows of every page; extracted once per PDF content (raw/tables/<sha>.json) """
         fn = self.download(url, suffix)
-        raw_data = []
-        with pdfplumber.open(fn) as pdf:
-            for page in pdf.pages:
-                raw_data += page.extract_table()
+        content = self.read_raw(fn)
+        tables = self._repo / 'tables' / f'{hashlib.sha256(content).hexdigest()}.json'
+        if tables.exists():
+            return fn, json.loads(tables.read_text())
+
+        with pdfplumber.open(io.BytesIO(content)) as pdf:
+            n_pages = len(pdf.pages)
+        workers = max(1, min(self.PDF_WORKERS, n_pages // self.PDF_PAGES_PER_WORKER))
+        chunks = [range(i, n_pages, workers) for i in range(workers)]
+        by_page = {}
+        if workers == 1:
+            by_page = _pdf_tables(content, chunks[0])
+        else:
+            for part in _pdf_pool(self.PDF_WORKERS).map(_pdf_tables, [content] * workers, chunks):
+                by_page |= part
+        raw_data = [row for i in range(n_pages) for row in by_page[i]]
+
+        tables.parent.mkdir(exist_ok=True)
+        tables.write_text(json.dumps(raw_data, ensure_ascii=False))
         return fn, raw_data
 
-    def get_json(self, url, suffix='eventos.json', payload=None, params=None) -> Tuple[Path, List]:
-        method_f = requests.post if payload else requests.get
-        fn = self.download(url, suffix, method_f=method_f, params=params if params is not None else payload)
-        text = fn.read_text(encoding='utf-8')
+    def _json(self, fn: Path):
+        text = self.read_raw(fn).decode('utf-8')
         try:
-            data = json.loads(text)
+            return json.loads(text)
         except json.JSONDecodeError as e:
             raise ValueError(f"Cached file {fn} is not valid JSON (got HTML?). Delete it and retry.\n  {e}") from None
-        return fn, data
+
+    def get_json(self, url, suffix='eventos.json', payload=None, params=None) -> Tuple[Path, List]:
+        method_f = requests.post if payload else requests.get
+        fn = self.download(url, suffix, method_f=method_f, params=params if params is not None else payload)
+        return fn, self._json(fn)
+
+    async def aget_json(self, url, suffix='eventos.json', payload=None, params=None) -> Tuple[Path, List]:
+        method = 'POST' if payload else 'GET'
+        fn = await self.adownload(url, suffix, method=method, params=params if params is not None else payload)
+        return fn, self._json(fn)
+
+    def gather(self, aws: Iterable[Awaitable]) -> List:
+        """ Run coroutines concurrently over shared per-host sessions """
+        async def _run():
+            async with AsyncSessionPool():
+                return await asyncio.gather(*aws)
+        return asyncio.run(_run())
+
+    def get_html_many(self,
+            pages: Iterable[Tuple[str, str]],
+            encoding: str | None = 'utf-8',
+            parse_only: SoupStrainer | None = None) -> List[Tuple[Path, BeautifulSoup]]:
+        """ Overlapping get_html for (url, suffix) pairs, results in order """
+        return self.gather([self.aget_html(url, suffix, encoding, parse_only) for url, suffix in pages])
+
+    def _is_unchanged(self, url: str, fingerprint: str) -> bool:
+        if self._manifest.fingerprint(url) != fingerprint:
+            return False
+        # Rotating refresh: a stable share of known pages each day
+        digest = hashlib.sha256(f'{url}{self.today()}'.encode()).hexdigest()
+        return int(digest[:8], 16) / 0xFFFFFFFF >= self.REFRESH_FRACTION
+
+    def get_details(self,
+            pages: Iterable[Tuple[str, str, str]],
+            encoding: str | None = 'utf-8',
+            parse_only: SoupStrainer | None = None,
+            tree: bool = False) -> List[Tuple[Path, Any]]:
+        """ Detail pages for (url, suffix, listing entry html), results in order
+
+            Only new or changed listing entries are requested; the others
+            are parsed from their newest archived page.
+        """
+        pages = list(pages)
+        results: List[Any] = [None] * len(pages)
+        fetch, fingerprints = [], []
+        for i, (url, suffix, listing) in enumerate(pages):
+            fingerprint = hashlib.sha256(listing.encode()).hexdigest()
+            fingerprints.append(fingerprint)
+            archived = None
+            if self.INCREMENTAL and not self._replay_day and self._is_unchanged(url, fingerprint):
+                archived = self._manifest.latest(suffix)
+            if archived:
+                fn = self._manifest.path(archived)
+                doc = lxml.html.fromstring(self._text(fn, encoding)) if tree else self._soup(fn, encoding, parse_only)
+                results[i] = (fn, doc)
+            else:
+                fetch.append(i)
+
+        if fetch:
+            print(f'{self.__class__.__name__}: {len(fetch)}/{len(pages)} detail pages new or changed')
+            requested = [pages[i][:2] for i in fetch]
+            fetched = (
+                self.get_tree_many(requested, encoding) if tree
+                else self.get_html_many(requested, encoding, parse_only)
+            )
+            for i, result in zip(fetch, fetched):
+                results[i] = result
+
+        if not self._replay_day: # Replays must not overwrite today's fingerprints
+            for (url, _, _), fingerprint in zip(pages, fingerprints):
+                self._manifest.seen(url, fingerprint)
+        return results
+
+    def get_tree_many(self,
+            pages: Iterable[Tuple[str, str]],
+            encoding: str | None = 'utf-8') -> List[Tuple[Path, lxml.html.HtmlElement]]:
+        """ Overlapping get_tree for (url, suffix) pairs, results in order """
+        return self.gather([self.aget_tree(url, suffix, encoding) for url, suffix in pages])
+
+    @staticmethod
+    def _take(results: List, is_last: Callable[[Any], bool]) -> Tuple[List, bool]:
+        """ Pages in order up to the first last one; failures past it are ignored """
+        pages = []
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+            pages.append(result)
+            if is_last(result[1]):
+                return pages, True
+        return pages, False
+
+    async def apaginate(self,
+            fetch: Callable[[int], Awaitable[Tuple[Path, Any]]],
+            is_last: Callable[[Any], bool],
+            total_pages: Callable[[Any], Optional[int]] | None = None,
+            window: int | None = None) -> List[Tuple[Path, Any]]:
+        """ All pages of a paged source, in order
+
+            fetch(page) -> (fn, data) for page numbers from 1; is_last(data)
+            tells a short or empty page. Pages are requested PAGE_WINDOW at a
+            time, stopping at the first last page (speculative pages past the
+            end are discarded, errors included). If total_pages(first page
+            data) knows the count, every remaining page is requested at once.
+        """
+        window = window or self.PAGE_WINDOW
+        fetch_all = lambda numbers: asyncio.gather(*(fetch(n) for n in numbers), return_exceptions=True)
+
+        pages, page = [], 1
+        if total_pages:
+            first = await fetch(1)
+            if is_last(first[1]):
+                return [first]
+            if total := total_pages(first[1]):
+                rest, _ = self._take(await fetch_all(range(2, total + 1)), is_last)
+                return [first] + rest
+            pages, page = [first], 2
+
+        while True:
+            taken, done = self._take(await fetch_all(range(page, page + window)), is_last)
+            pages += taken
+            if done:
+                return pages
+            page += window
+
+    def paginate(self, *args, **kwargs) -> List[Tuple[Path, Any]]:
+        """ Blocking apaginate """
+        return self.gather([self.apaginate(*args, **kwargs)])[0]
 
     @abstractmethod
-    def trigger(self) -> List[RawEvent]:
+    def trigger(self) -> Iterator[RawEvent]:
         raise NotImplementedError
 
 
@@ -169,21 +557,49 @@ class BronzeLayer:
 
     @classmethod
     def store_jsonl(klass,
-            event_list: List[RawEvent], repo: Path | str = '') -> Path:
-        today = date.today().isoformat()
+            event_list: List[RawEvent], repo: Path | str = '', day: date | None = None) -> Path:
+        today = (day or date.today()).isoformat()
         fn = klass.BASE / repo / f'{today}.jsonl'
         with jsonlines.open(fn, mode='w') as writer:
             writer.write_all([e.to_dict() for e in event_list])
         return fn
 
     @classmethod
-    def store_db(klass, events_jsonl: Path):
+    def store_db(klass, events_jsonl: Path, newer_only: bool = False):
         from db import Persistence
         p = Persistence()
-        results = p.store_raw_events(events_jsonl)
+        results = p.store_raw_events(events_jsonl, newer_only)
         p._vacuum() # Optional
         return results
 
+    @classmethod
+    def reextract(klass, crawler_cls, start: date, end: date, workers: int | None = None) -> Path:
+        """ Re-run a crawler over its archived raw files, one process per day
+
+            Rewrites the per-day bronze JSONL of the repo and merges the
+            corrected events into raw_events in a single load. Replayed
+            events keep their original crawled_at and never replace a newer
+            row: to fix events still listed, the range must run through
+            today. Silver is not touched, see scripts/reextract.py.
+        """
+        days = [d for d in crawler_cls.archived_days() if start <= d <= end]
+        # Index built here, once; workers only get the raw files of their day
+        Manifest.open(crawler_cls.raw_dir())
+        archives = [crawler_cls.archive(day) for day in days]
+        all_events = []
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            for day, events in zip(days, pool.map(_replay, [crawler_cls] * len(days), days, archives)):
+                klass.store_jsonl(events, crawler_cls.REPO, day=day)
+                all_events += events
+                print(f'{crawler_cls.__name__} {day}: {len(events)} events')
+
+        fn = klass.BASE / crawler_cls.REPO / f'reextract-{start}-{end}.jsonl'
+        with jsonlines.open(fn, mode='w') as writer:
+            writer.write_all([e.to_dict() for e in all_events])
+        if all_events:
+            klass.store_db(fn, newer_only=True)
+        return fn
+
     @classmethod
     def load_new_events(klass):
         from db import Persistence
@@ -196,9 +612,19 @@ class BronzeLayer:
         return results
 
     @classmethod
-    def load_low_quality_events(klass):
+    def load_latest_events(klass, urls: List[str]):
         from db import Persistence
-        return Persistence().load_low_quality_events()
+        return Persistence().load_latest_events(urls)
+
+    @classmethod
+    def load_low_quality_events(klass, resolver_version: int = 0):
+        from db import Persistence
+        return Persistence().load_low_quality_events(resolver_version)
+
+    @classmethod
+    def record_attempts(klass, urls: List[str], resolver_version: int):
+        from db import Persistence
+        Persistence().record_attempts(urls, resolver_version)
 
     @staticmethod
     def collect_all(bronze_events: List[Crawler]) -> List[RawEvent]:
@@ -211,6 +637,179 @@ class BronzeLayer:
         return [max(repo.latest(glob='../*.jsonl')) for repo in bronze_events]
 
 
+class BronzeSink:
+    """ Streaming end of the extract pipeline
+
+        Consumes crawler generators and, in one pass, writes each event to
+        the per-source JSONL and the combined JSONL, and merges batches of
+        them into raw_events. Events yielded before a crawler fails are
+        kept: everything buffered is flushed on exit, even on error.
+        A retried crawler rewrites its own JSONL, but events it already
+        yielded (by url) are not written to the combined JSONL nor
+        merged again. With append=True a resumed run adds to today's
+        combined JSONL.
+    """
+
+    BASE = BronzeLayer.BASE
+    BATCH_SIZE = 500
+
+    def __init__(self, batch_size: int = BATCH_SIZE, append: bool = False):
+        self._today = date.today().isoformat()
+        self._batch_size = batch_size
+        self._batch: List[Dict] = []
+        self._seen: Set[Tuple[str, str]] = set()
+        self._lock = threading.Lock()     # combined JSONL and the pending batch
+        self._db_lock = threading.Lock()  # one MERGE at a time, without stalling the crawlers
+        self.BASE.mkdir(parents=True, exist_ok=True)
+        self._combined = jsonlines.open(self.BASE / f'{self._today}.jsonl', mode='a' if append else 'w')
+        self._persistence = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        with self._lock:
+            batch, self._batch = self._batch, []
+            self._combined.close()
+        self._store(batch)
+        if self._persistence:
+            self._persistence._vacuum() # Optional
+
+    def consume(self, crawler: Crawler) -> int:
+        count = 0
+        with jsonlines.open(self.BASE / crawler.REPO / f'{self._today}.jsonl', mode='w') as writer:
+            for event in crawler.trigger():
+                obj = event.to_dict()
+                writer.write(obj)
+                count += 1
+                key, full = (str(crawler.REPO), obj['url']), []
+                with self._lock:
+                    if key not in self._seen: # Else already consumed by a failed attempt
+                        self._seen.add(key)
+                        self._combined.write(obj)
+                        self._batch.append(obj)
+                        if len(self._batch) >= self._batch_size:
+                            full, self._batch = self._batch, []
+                self._store(full)
+        return count
+
+    def _store(self, batch: List[Dict]):
+        if not batch:
+            return
+        from db import Persistence
+        with self._db_lock:
+            self._persistence = self._persistence or Persistence()
+            fn = self.BASE / f'{self._today}.batch.jsonl'
+            with jsonlines.open(fn, mode='w') as writer:
+                writer.write_all(batch)
+            self._persistence.store_raw_events(fn)
+
+
+_pdf_executor: ProcessPoolExecutor | None = None
+_pdf_executor_lock = threading.Lock()
+
+
+def _pdf_pool(workers: int) -> ProcessPoolExecutor:
+    """ One process pool shared by every crawler thread, started on first use
+
+        Spawned, not forked: extract() forks from a threaded process holding
+        sqlite connections and scheduler locks, which can deadlock the child.
+    """
+    global _pdf_executor
+    with _pdf_executor_lock:
+        if _pdf_executor is None:
+            _pdf_executor = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        return _pdf_executor
+
+
+def _pdf_tables(content: bytes, pages: Iterable[int]) -> Dict[int, List]:
+    """ Process pool worker for Crawler.get_pdf: table rows of some pages """
+    with pdfplumber.open(io.BytesIO(content)) as pdf:
+        return {i: pdf.pages[i].extract_table() or [] for i in pages}
+
+
+def _replay(crawler_cls, day: date, archive: Dict[str, Path]) -> List[RawEvent]:
+    """ Process pool worker for BronzeLayer.reextract """
+    crawler = crawler_cls()
+    crawler.replay(day, archive)
+    try:
+        return list(crawler.trigger())
+    except FileNotFoundError as e:
+        print(f'{crawler_cls.__name__} {day}: skipped, {e}')
+        return []
+
+
+class ParseContext:
+    """ One document going through Extractor.parse
+
+        Wraps the node handed to the field extractors (soup, lxml element,
+        JSON row) and memoizes lookups, so title()/date()/local()/url()
+        share one walk of the DOM per selector.
+    """
+
+    def __init__(self, node):
+        self.node = node
+        self._memo = {}
+
+    @classmethod
+    def of(klass, node) -> 'ParseContext':
+        return node if isinstance(node, klass) else klass(node)
+
+    def memo(self, key, fn):
+        if key not in self._memo:
+            self._memo[key] = fn()
+        return self._memo[key]
+
+    def _lookup(self, method, *args, **kwargs):
+        key = (method, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError: # e.g. list-valued filters: not cacheable
+            return getattr(self.node, method)(*args, **kwargs)
+        return self.memo(key, lambda: getattr(self.node, method)(*args, **kwargs))
+
+    def find(self, *args, **kwargs):
+        return self._lookup('find', *args, **kwargs)
+
+    def find_all(self, *args, **kwargs):
+        return self._lookup('find_all', *args, **kwargs)
+
+    def xpath(self, *args, **kwargs):
+        return self._lookup('xpath', *args, **kwargs)
+
+    def meta(self, prop: str) -> Optional[str]:
+        """ <meta property=...> content, all of them indexed on first use """
+        def index():
+            metas = {}
+            for m in self.node.find_all('meta', property=True):
+                metas.setdefault(m.get('property'), m.get('content', ''))
+            return metas
+        return self.memo('meta', index).get(prop)
+
+    # Containers behave like the wrapped ResultSet/list/dict/element
+    def __getitem__(self, key):
+        return self.node[key]
+
+    def __len__(self):
+        return len(self.node)
+
+    def __iter__(self):
+        return iter(self.node)
+
+    def __contains__(self, item):
+        return item in self.node
+
+    def __bool__(self):
+        return bool(self.node)
+
+    def __getattr__(self, name):
+        return getattr(self.node, name)
+
+    def __str__(self):
+        return str(self.node)
+
+
 class Extractor(ABC):
 
     @abstractmethod
@@ -243,6 +842,7 @@ class Extractor(ABC):
 
     def parse(self, soup: BeautifulSoup, filepath: Path) -> RawEvent:
         event = None
+        soup = ParseContext.of(soup)
         try:
              event = RawEvent(
                 title=self.title(soup),
@@ -0,0 +1,370 @@
+import re
+import json
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+import zstandard as zstd
+from decouple import config
+
+
+class Manifest:
+    """ Per-repo index of the raw cache
+
+        SQLite file living next to the raw files of a repo:
+            key -> newest file, suffix, mtime, sha256, HTTP validators
+
+        Raw files are named <day>~<key prefix>-<suffix>, so requests sharing
+        a suffix on the same day never overwrite each other (older files are
+        plain <day>-<suffix>).
+
+        Lookups hit the index instead of globbing the raw directory. The
+        index is disposable: if lost it is rebuilt from the files on disk
+        (rebuilt rows are matched by suffix until their request is seen again).
+
+        Also keeps a fingerprint of the listing entry behind each detail
+        page, so incremental crawls can tell new or changed entries apart.
+    """
+
+    INDEX = '.manifest.sqlite'
+    MAX_AGE = timedelta(hours=23)
+    RAW_NAME = re.compile(r'^\d{4}-\d{2}-\d{2}(?:~(?P<key>[0-9a-f]+))?-(?P<suffix>.+)$')
+    KEY_CHARS = 10
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS entries (
+            key           TEXT UNIQUE,
+            suffix        TEXT NOT NULL,
+            file          TEXT NOT NULL,
+            mtime         REAL NOT NULL,
+            sha256        TEXT NOT NULL,
+            etag          TEXT,
+            last_modified TEXT,
+            fetched_at    TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS entries_suffix ON entries (suffix, mtime);
+        CREATE TABLE IF NOT EXISTS listing (
+            url           TEXT PRIMARY KEY,
+            fingerprint   TEXT NOT NULL,
+            seen_at       TEXT NOT NULL
+        );
+    """
+
+    _registry: Dict[Path, 'Manifest'] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, repo: Path):
+        self._repo = repo
+        self._lock = threading.Lock()
+        fn = repo / self.INDEX
+        missing = not fn.exists()
+        self._conn = sqlite3.connect(fn, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(self.SCHEMA)
+        if missing:
+            self.rebuild()
+
+    @classmethod
+    def open(klass, repo: Path) -> 'Manifest':
+        """ One instance per raw directory, shared by crawlers on the same repo """
+        with klass._registry_lock:
+            if repo not in klass._registry:
+                klass._registry[repo] = klass(repo)
+            return klass._registry[repo]
+
+    @staticmethod
+    def key(method: str, url: str, params=None, payload=None) -> str:
+        blob = json.dumps(
+            [method.upper(), url, params or {}, payload or {}],
+            sort_keys=True, default=str)
+        return hashlib.sha256(blob.encode()).hexdigest()
+
+    @classmethod
+    def raw_name(klass, day: str, key: str, suffix: str) -> str:
+        return f'{day}~{key[:klass.KEY_CHARS]}-{suffix}'
+
+    def rebuild(self) -> int:
+        """ Re-index the raw directory: newest file per suffix """
+        newest = {}
+        for fp in self._repo.iterdir():
+            m = self.RAW_NAME.match(fp.name)
+            if not m or not fp.is_file():
+                continue
+            suffix = m['suffix']
+            if suffix not in newest or fp.name > newest[suffix].name:
+                newest[suffix] = fp
+
+        rows = []
+        for suffix, fp in newest.items():
+            mtime = fp.stat().st_mtime
+            data = fp.read_bytes()
+            rows.append((
+                suffix, fp.name, mtime,
+                BlobStore.pointer_sha(data) or hashlib.sha256(data).hexdigest(),
+                datetime.fromtimestamp(mtime).isoformat(),
+            ))
+
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.executemany("""
+                INSERT INTO entries (suffix, file, mtime, sha256, fetched_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, rows)
+        return len(rows)
+
+    def get(self, key: str, suffix: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                # Rebuilt from disk: the request is unknown, match by suffix
+                row = self._conn.execute("""
+                    SELECT * FROM entries WHERE key IS NULL AND suffix = ?
+                    ORDER BY mtime DESC LIMIT 1
+                """, (suffix,)).fetchone()
+        if row and (self._repo / row['file']).exists():
+            return dict(row)
+        return None
+
+    def latest(self, suffix: str) -> Optional[Dict[str, Any]]:
+        """ Newest archived file for a suffix, whatever request produced it """
+        with self._lock:
+            row = self._conn.execute("""
+                SELECT * FROM entries WHERE suffix = ?
+                ORDER BY mtime DESC LIMIT 1
+            """, (suffix,)).fetchone()
+        if row and (self._repo / row['file']).exists():
+            return dict(row)
+        return None
+
+    def fingerprint(self, url: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fingerprint FROM listing WHERE url = ?", (url,)).fetchone()
+        return row['fingerprint'] if row else None
+
+    def seen(self, url: str, fingerprint: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("""
+                INSERT OR REPLACE INTO listing (url, fingerprint, seen_at)
+                VALUES (?, ?, ?)
+            """, (url, fingerprint, datetime.now().isoformat()))
+
+    def path(self, entry: Dict[str, Any]) -> Path:
+        return self._repo / entry['file']
+
+    def is_fresh(self, entry: Dict[str, Any]) -> bool:
+        age = datetime.now() - datetime.fromisoformat(entry['fetched_at'])
+        return age < self.MAX_AGE
+
+    @staticmethod
+    def conditional_headers(entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        if not entry:
+            return {}
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def put(self, key: str, suffix: str, fn: Path, content: bytes, headers) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM entries WHERE key = ? OR (key IS NULL AND suffix = ?)",
+                (key, suffix))
+            self._conn.execute("""
+                INSERT INTO entries
+                    (key, suffix, file, mtime, sha256, etag, last_modified, fetched_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                key, suffix, fn.name, fn.stat().st_mtime,
+                hashlib.sha256(content).hexdigest(),
+                headers.get('ETag'), headers.get('Last-Modified'),
+                datetime.now().isoformat(),
+            ))
+
+    def revalidated(self, key: str, suffix: str) -> None:
+        """ 304 Not Modified: the stored body is current again """
+        with self._lock, self._conn:
+            self._conn.execute("""
+                UPDATE entries SET key = ?, fetched_at = ?
+                WHERE key = ? OR (key IS NULL AND suffix = ?)
+            """, (key, datetime.now().isoformat(), key, suffix))
+
+
+class BlobStore:
+    """ Content-addressed, zstd-compressed raw pages
+
+        raw/blobs/ab/abcdef....zst   page body, named by the sha256 of its content
+        raw/blobs/dict-<id>.zdict    dictionaries trained on the repo's own pages
+        raw/2025-11-01-home.html     pointer file: "xcmagg-blob sha256:<hex>"
+
+        Identical pages are stored once. Legacy plain files are still readable.
+    """
+
+    DIR = 'blobs'
+    LEVEL = 12
+    DICT_SIZE = 112 * 1024
+    POINTER = b'xcmagg-blob sha256:'
+
+    _registry: Dict[Path, 'BlobStore'] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, repo: Path):
+        self._dir = repo / self.DIR
+        self._dir.mkdir(exist_ok=True)
+        self._dicts: Dict[int, zstd.ZstdCompressionDict] = {}
+        self._dict = None
+        # Newest dictionary compresses; all of them stay around to decompress
+        for fp in sorted(self._dir.glob('dict-*.zdict'), key=lambda p: p.stat().st_mtime):
+            self._dict = zstd.ZstdCompressionDict(fp.read_bytes())
+            self._dicts[self._dict.dict_id()] = self._dict
+
+    @classmethod
+    def open(klass, repo: Path) -> 'BlobStore':
+        with klass._registry_lock:
+            if repo not in klass._registry:
+                klass._registry[repo] = klass(repo)
+            return klass._registry[repo]
+
+    @classmethod
+    def pointer_sha(klass, data: bytes) -> Optional[str]:
+        if data.startswith(klass.POINTER):
+            return data[len(klass.POINTER):].strip().decode()
+        return None
+
+    def _blob(self, sha: str) -> Path:
+        return self._dir / sha[:2] / f'{sha}.zst'
+
+    def write(self, fn: Path, content: bytes) -> str:
+        """ Store content once and point fn at it """
+        sha = hashlib.sha256(content).hexdigest()
+        blob = self._blob(sha)
+        if not blob.exists():
+            blob.parent.mkdir(exist_ok=True)
+            cctx = zstd.ZstdCompressor(level=self.LEVEL, dict_data=self._dict)
+            tmp = blob.with_suffix(f'.{threading.get_ident()}.tmp')
+            tmp.write_bytes(cctx.compress(content))
+            tmp.replace(blob)
+        fn.write_bytes(self.POINTER + sha.encode() + b'\n')
+        return sha
+
+    def read(self, fn: Path) -> bytes:
+        data = fn.read_bytes()
+        sha = self.pointer_sha(data)
+        if sha is None:
+            return data # Legacy: stored as is
+        compressed = self._blob(sha).read_bytes()
+        dict_id = zstd.get_frame_parameters(compressed).dict_id
+        dctx = zstd.ZstdDecompressor(dict_data=self._dicts[dict_id]) if dict_id else zstd.ZstdDecompressor()
+        return dctx.decompress(compressed)
+
+    def train_dictionary(self, samples: List[bytes]) -> Optional[int]:
+        """ Train a dictionary on pages of this source; used by new blobs only """
+        try:
+            d = zstd.train_dictionary(self.DICT_SIZE, samples, level=self.LEVEL)
+        except zstd.ZstdError as e:
+            print(f'Not enough samples to train a dictionary in {self._dir}: {e}')
+            return None
+        (self._dir / f'dict-{d.dict_id()}.zdict').write_bytes(d.as_bytes())
+        self._dicts[d.dict_id()] = d
+        self._dict = d
+        return d.dict_id()
+
+
+class LLMCache:
+    """ Disk-backed cache of model responses, shared by every process
+
+        sha256(function, model, prompt, schema version) -> JSON response
+
+        Entries expire after TTL; past MAX_BYTES the least recently used
+        ones are evicted. SQLite in WAL mode, so concurrent runs share it.
+    """
+
+    PATH = Path(__file__).parent / 'data' / 'llm_cache.sqlite'
+    TTL = timedelta(days=config('LLM_CACHE_TTL_DAYS', default=90, cast=int))
+    MAX_BYTES = config('LLM_CACHE_MAX_MB', default=256, cast=int) * 1024 * 1024
+    EVICT_EVERY = 100
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS responses (
+            key           TEXT PRIMARY KEY,
+            function      TEXT NOT NULL,
+            model         TEXT NOT NULL,
+            response      TEXT NOT NULL,
+            created_at    TEXT NOT NULL,
+            accessed_at   TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at);
+    """
+
+    _instance: Optional['LLMCache'] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, path: Path = PATH):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+
+    @classmethod
+    def open(klass) -> 'LLMCache':
+        with klass._instance_lock:
+            if klass._instance is None:
+                klass._instance = klass()
+            return klass._instance
+
+    @staticmethod
+    def key(function: str, model: str, prompt: str, version: int) -> str:
+        blob = json.dumps([function, model, prompt, version], ensure_ascii=False)
+        return hashlib.sha256(blob.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = datetime.now()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT response FROM responses WHERE key = ? AND created_at > ?",
+                (key, (now - self.TTL).isoformat())).fetchone()
+            if row:
+                self._conn.execute(
+                    "UPDATE responses SET accessed_at = ? WHERE key = ?", (now.isoformat(), key))
+        return row[0] if row else None
+
+    def put(self, key: str, function: str, model: str, response: str) -> None:
+        now = datetime.now().isoformat()
+        with self._lock, self._conn:
+            self._conn.execute("""
+                INSERT OR REPLACE INTO responses
+                    (key, function, model, response, created_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (key, function, model, response, now, now))
+            self._puts += 1
+            if self._puts % self.EVICT_EVERY == 0:
+                self._evict()
+
+    def _evict(self):
+        """ Drop expired entries, then least recently used ones down to MAX_BYTES """
+        self._conn.execute(
+            "DELETE FROM responses WHERE created_at <= ?",
+            ((datetime.now() - self.TTL).isoformat(),))
+        total = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(response) + LENGTH(key)), 0) FROM responses").fetchone()[0]
+        if total <= self.MAX_BYTES:
+            return
+        # Oldest accessed first, until enough bytes are freed
+        self._conn.execute("""
+            DELETE FROM responses WHERE key IN (
+                SELECT key FROM (
+                    SELECT key, LENGTH(response) + LENGTH(key) AS size,
+                           SUM(LENGTH(response) + LENGTH(key))
+                               OVER (ORDER BY accessed_at ROWS UNBOUNDED PRECEDING) AS freed
+                    FROM responses
+                ) WHERE freed - size < ?
+            )
+        """, (total - self.MAX_BYTES,))
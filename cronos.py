@@ -5,7 +5,8 @@ from datetime import datetime, date
 from urllib.parse import urlparse, urljoin
 
 from curl_cffi import requests as cf_requests
-from bronze import Crawler, Extractor
+from bronze import Crawler, Extractor, ParseContext, strainer
+from scheduler import HostScheduler
 
 
 class TIOnline(Crawler, Extractor):
@@ -17,6 +18,7 @@ class TIOnline(Crawler, Extractor):
         'DDD': '38',
         'Tags': ['Kenda Cup',]
     }
+    PARSE_ONLY = strainer('div', 'slider__footer')
 
     def title(self, soup) -> str:
         return soup.find('div', class_='title').text.strip()
@@ -31,13 +33,10 @@ class TIOnline(Crawler, Extractor):
         return soup.find('a').get('href')
 
     def trigger(self):
-        fp, soup = self.get_html(self.URL, suffix='home.html')
+        fp, soup = self.get_html(self.URL, suffix='home.html', parse_only=self.PARSE_ONLY)
         div = soup.find_all('div', 'slider__footer')
-        events_acc = []
         for d in div:
-            events_acc.append(self.parse(d, fp))
-
-        return events_acc
+            yield self.parse(d, fp)
 
 
 class CorridaPronta(Crawler, Extractor):
@@ -49,16 +48,8 @@ class CorridaPronta(Crawler, Extractor):
     }
 
 
-    def _call(self, method_f, endpoint, params={}, payload={}, crawl_delay=1):
-        import time
-        time.sleep(crawl_delay)
-        cf_method = cf_requests.post if method_f.__name__ == 'post' else cf_requests.get
-        kwargs = {'impersonate': 'chrome', 'timeout': 60}
-        if params:
-            kwargs['params'] = params
-        if payload:
-            kwargs['data'] = payload
-        return cf_method(endpoint, **kwargs)
+    IMPERSONATE = 'chrome'
+    TIMEOUT = 60
 
     def title(self, soup) -> str:
         p = soup.find('p')
@@ -79,19 +70,14 @@ class CorridaPronta(Crawler, Extractor):
         fp, soup = self.get_html(endpoint, suffix='eventos')
         div = soup.find_all('div', 's-12 m-6 l-3')
 
-        href_list = []
+        pages = []
         for d in div:
             href = d.find('a').get('href')
             if href != 'http://www.fbresportes.com':
-                href_list.append(href)
+                pages.append((urljoin(self.URL, href), re.sub(r'(?u)[^-\w.]', '_', href), str(d)))
 
-        events_acc = []
-        for href in href_list:
-            url = urljoin(self.URL, href)
-            fn = re.sub(r'(?u)[^-\w.]', '_', href)
-            fp, soup2 = self.get_html(url, suffix=fn)
-            events_acc.append(self.parse(soup2, fp))
-        return events_acc
+        for fp, soup2 in self.get_details(pages):
+            yield self.parse(soup2, fp)
 
 
 class Corridao(Crawler, Extractor):
@@ -113,6 +99,7 @@ class ActiveSports(Crawler, Extractor):
         'Tags': ['Rota do Vulcão XCM',],
         'DDD': '35',
     }
+    PARSE_ONLY = strainer('div', 'content-course')
 
     def title(self, soup) -> str:
         return soup[0].text.strip()
@@ -128,14 +115,11 @@ class ActiveSports(Crawler, Extractor):
 
     def trigger(self):
         endpoint = urljoin(self.URL, 'proximos-eventos')
-        fp, soup = self.get_html(endpoint, suffix='proximos-eventos')
+        fp, soup = self.get_html(endpoint, suffix='proximos-eventos', parse_only=self.PARSE_ONLY)
         div = soup.find_all('div', class_='content-course')
 
-        events_acc = []
         for d in div:
-            events_acc.append(self.parse(d.find_all('a'), fp))
-
-        return events_acc
+            yield self.parse(d.find_all('a'), fp)
 
 class InscricaoExtreme(Crawler, Extractor):
     URL = 'https://www.inscricoesxtreme.com.br/'
@@ -171,11 +155,14 @@ class GpsControlCrono(Crawler, Extractor):
         return title_font.get_text(strip=True)
 
     def _info_line(self, soup) -> str:
-        for p in soup.find_all('p', align='center'):
-            text = p.get_text(strip=True)
-            if re.match(r'.+ - [A-Z]{2} - \d{2}/\d{2}/\d{4}', text):
-                return text
-        return ''
+        soup = ParseContext.of(soup)
+        def find():
+            for p in soup.find_all('p', align='center'):
+                text = p.get_text(strip=True)
+                if re.match(r'.+ - [A-Z]{2} - \d{2}/\d{2}/\d{4}', text):
+                    return text
+            return ''
+        return soup.memo('info_line', find)
 
     def local(self, soup) -> str:
         text = self._info_line(soup)
@@ -193,21 +180,17 @@ class GpsControlCrono(Crawler, Extractor):
 
     def trigger(self):
         fp, soup = self.get_html(self.URL, suffix='home.html')
-        seen, hrefs = set(), []
+        seen, pages = set(), []
         for a in soup.find_all('a', href=re.compile(r'evento\d+\.php')):
             href = a['href']
             if href not in seen:
                 seen.add(href)
-                hrefs.append(href)
+                event_id = re.search(r'evento(\d+)', href).group(1)
+                pages.append((urljoin(self.URL, href), f'evento{event_id}.html', str(a)))
 
-        events_acc = []
-        for href in hrefs:
-            event_id = re.search(r'evento(\d+)', href).group(1)
-            self._current_event_url = urljoin(self.URL, href)
-            efp, event_soup = self.get_html(self._current_event_url, suffix=f'evento{event_id}.html')
-            events_acc.append(self.parse(event_soup, efp))
-
-        return events_acc
+        for (url, _, _), (efp, event_soup) in zip(pages, self.get_details(pages)):
+            self._current_event_url = url
+            yield self.parse(event_soup, efp)
 
 
 class SeuEsporteApp(Crawler, Extractor):
@@ -234,10 +217,8 @@ class SeuEsporteApp(Crawler, Extractor):
         fp, soup = self.get_html(self.URL)
         div = soup.find_all('div', class_='block block-rounded h-100 mb-0')
 
-        events_acc = []
         for d in div:
-            events_acc.append(self.parse(d, fp))
-        return events_acc
+            yield self.parse(d, fp)
 
 
 class Peloto(Crawler, Extractor):
@@ -251,67 +232,63 @@ class Peloto(Crawler, Extractor):
     }
 
     def title(self, soup) -> str:
+        soup = ParseContext.of(soup)
         div = soup.find('div', class_='row red darken-4 white-text center')
         if div:
             return div.find('h4').text.strip()
         # new LP-style page: use og:title meta tag
-        meta = soup.find('meta', property='og:title')
-        if meta:
-            return meta.get('content', '').strip()
+        content = soup.meta('og:title')
+        if content is not None:
+            return content.strip()
         return soup.find('title').text.strip()
 
     def date(self, soup) -> str:
+        soup = ParseContext.of(soup)
         div = soup.find('div', class_='row red darken-4 white-text center')
         if div:
             return div.find_all('h5')[1].text.strip()
         # new LP-style page: og:description is "CITY - DD/MM/YYYY"
-        meta = soup.find('meta', property='og:description')
-        if meta:
-            content = meta.get('content', '')
+        content = soup.meta('og:description')
+        if content is not None:
             parts = content.split(' - ')
             return parts[-1].strip()
         raise ValueError("Cannot extract date from page")
 
     def local(self, soup) -> str:
+        soup = ParseContext.of(soup)
         local = soup.find('div', class_='col s12 m8 l8 white-text')
         if local:
             return local.find('div', class_='card').find('h5').text.strip()
         # new LP-style page: og:description is "CITY - DD/MM/YYYY"
-        meta = soup.find('meta', property='og:description')
-        if meta:
-            content = meta.get('content', '')
+        content = soup.meta('og:description')
+        if content is not None:
             parts = content.split(' - ')
             return parts[0].strip()
         raise ValueError("Cannot extract local from page")
 
     def url(self, soup) -> str:
+        soup = ParseContext.of(soup)
         href_tag = soup.find('a', class_='btn-large')
         if href_tag:
             href = href_tag.get('href')
             return urljoin(self.URL, href)
         # new LP-style page: use og:url
-        meta = soup.find('meta', property='og:url')
-        if meta:
-            return meta.get('content', '').strip()
+        content = soup.meta('og:url')
+        if content is not None:
+            return content.strip()
         raise ValueError("Cannot extract url from page")
 
     def trigger(self):
         fp, soup = self.get_html(self.URL, suffix='home.html')
         div = soup.find_all('div', 'prox-eventos')
 
-        href_list = []
+        pages = []
         for d in div:
             href = d.find('a').get('href')
-            href_list.append(href)
-
-        events_acc = []
-        for href in href_list:
-            url = urljoin(self.URL, href)
-            fn = re.sub(r'(?u)[^-\w.]', '_', href)
-            fp, soup2 = self.get_html(url, suffix=fn)
-            events_acc.append(self.parse(soup2, fp))
+            pages.append((urljoin(self.URL, href), re.sub(r'(?u)[^-\w.]', '_', href), str(d)))
 
-        return events_acc
+        for fp, soup2 in self.get_details(pages):
+            yield self.parse(soup2, fp)
 
 
 class ProximaProva():
@@ -342,11 +319,8 @@ class Nuflow(Crawler, Extractor):
         api = 'https://nuflowpass.herokuapp.com/api/v2/events'
         fp, data = self.get_json(api, suffix='events.json')
 
-        events_acc = []
         for row in data['events']:
-            events_acc.append(self.parse(row, fp))
-
-        return events_acc
+            yield self.parse(row, fp)
 
 class TicketBr(Crawler, Extractor):
     URL = 'https://www.ticketbr.com.br/'
@@ -391,20 +365,18 @@ class TicketBr(Crawler, Extractor):
         fp, soup = self.get_html(endpoint, suffix='calendario', encoding='iso-8859-1')
         div = soup.find('div', class_='calendario')
 
-        buffer, events_acc = '', []
+        buffer = ''
         for node in div.children:
             if node.name == 'hr':
                 new_soup = BeautifulSoup(buffer, "lxml")
                 event = self.parse(new_soup, fp)
-                events_acc.append(event)
+                yield event
                 buffer = '' # Reset State
             else:
                 if not node.name and str(node).strip():
                     continue
                 buffer += str(node)
 
-        return events_acc
-
 class Polesportivo(Crawler, Extractor):
     URL = 'https://polesportivo.com.br/'
     REPO = Path('polesportivo.com.br')
@@ -444,10 +416,8 @@ class Polesportivo(Crawler, Extractor):
         fp, soup = self.get_html(endpoint, suffix='eventos.html')
         cells = soup.find_all('div', class_='mdc-layout-grid__cell')
 
-        events_acc = []
         for cell in cells:
-            events_acc.append(self.parse(cell, fp))
-        return events_acc
+            yield self.parse(cell, fp)
 
 
 class _DesafioRuralBase(Crawler, Extractor):
@@ -460,10 +430,12 @@ class _DesafioRuralBase(Crawler, Extractor):
     _NASC = '09/07/1990'
 
     def _well(self, soup):
-        for div in soup.find_all('div', class_='well'):
-            if div.find('b'):
-                return div
-        return None
+        def find():
+            for div in soup.find_all('div', class_='well'):
+                if div.find('b'):
+                    return div
+            return None
+        return ParseContext.of(soup).memo('well', find)
 
     def title(self, soup) -> str:
         return self._well(soup).find_all('h3')[2].get_text(strip=True)
@@ -482,19 +454,23 @@ class _DesafioRuralBase(Crawler, Extractor):
     def trigger(self):
         fp, get_soup = self.get_html(self.URL, suffix='get.html')
 
-        post_fp = self._repo / f'{date.today().isoformat()}-post.html'
-        if not self._is_file_fresh(post_fp):
+        post_fp = self._repo / f'{self.today().isoformat()}-post.html'
+        if self._replay_day:
+            post_fp = self._archived('post.html')
+        elif not self._is_file_fresh(post_fp):
             ghash = get_soup.find('input', id='ghash')['value']
+            HostScheduler.wait(self.URL, self.IMPERSONATE)
             resp = cf_requests.post(self.URL, data={
                 'ic': '', 'ghash': ghash,
                 'cpf': self._CPF, 'datanascimento': self._NASC, 'sexo': 'Masculino',
             })
-            post_fp.write_bytes(resp.content)
+            self.write_raw(post_fp, resp.content)
 
-        _, post_soup = self.get_html(self.URL, suffix='post.html')
+        # Same URL as get.html, so read the POST response directly instead of via the cache
+        post_soup = self._soup(post_fp, 'utf-8')
         if self._well(post_soup) is None:
-            return []
-        return [self.parse(post_soup, fp)]
+            return
+        yield self.parse(post_soup, fp)
 
 
 class DrMtbRace(_DesafioRuralBase):
@@ -613,16 +589,13 @@ class FPCiclismo(Crawler, Extractor):
 
     def trigger(self):
 
-        events_acc = []
         for category in {'calendario-mtb', 'calendario-estrada'}:
             fn, raw_data = self.get_latest_pdf(category)
             format_date = category in {'calendario-estrada'}
             sanitize_list = FPCiclismo.sanitize_calendar(raw_data, format_date)
             for content in sanitize_list:
                 event = self.parse(content, fn)
-                events_acc.append(event)
-
-        return events_acc
+                yield event
 
 
 class Fmc(Crawler, Extractor):
@@ -648,7 +621,8 @@ class Fmc(Crawler, Extractor):
         return datetime.strptime(dates[0], '%d/%m/%Y').strftime('%Y-%m-%d')
 
     def _cells(self, soup):
-        return [td.get_text(strip=True) for td in soup.find_all('td')]
+        soup = ParseContext.of(soup)
+        return soup.memo('cells', lambda: [td.get_text(strip=True) for td in soup.find_all('td')])
 
     def title(self, soup) -> str:
         return self._cells(soup)[4]
@@ -672,13 +646,11 @@ class Fmc(Crawler, Extractor):
         fp, soup = self.get_html(self.URL, suffix='calendario.html')
         table = soup.find('table')
         rows = table.find_all('tr')
-        events_acc = []
         for row in rows:
             cells = [td.get_text(strip=True) for td in row.find_all('td')]
             if len(cells) != 9 or not cells[4] or cells[4] == 'EVENTO':
                 continue
-            events_acc.append(self.parse(row, fp))
-        return events_acc
+            yield self.parse(row, fp)
 
 
 class FpcParana(Crawler, Extractor):
@@ -712,4 +684,4 @@ class FpcParana(Crawler, Extractor):
     def trigger(self):
         fp, soup = self.get_html(f'{self.URL}?per_page=100', suffix='eventos.html')
         cards = soup.find_all('div', class_='product-element-bottom')
-        return [self.parse(card, fp) for card in cards]
+        yield from (self.parse(card, fp) for card in cards)
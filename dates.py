@@ -0,0 +1,88 @@
+import re
+from datetime import date
+from typing import Optional, Tuple
+
+from geo import unaccent
+
+
+MONTHS = {
+    'janeiro': 1, 'fevereiro': 2, 'marco': 3, 'abril': 4, 'maio': 5, 'junho': 6,
+    'julho': 7, 'agosto': 8, 'setembro': 9, 'outubro': 10, 'novembro': 11, 'dezembro': 12,
+}
+MONTHS |= {name[:3]: n for name, n in MONTHS.items()}
+
+_MONTH = '|'.join(sorted(MONTHS, key=len, reverse=True))
+
+# One full date: 2025-11-09[T08:30], 09/11/2025, 09 de novembro de 2025, 9 nov. 2025
+_FULL = re.compile(rf"""
+      \b(?P<iy>\d{{4}})-(?P<im>\d{{2}})-(?P<id>\d{{2}})
+    | \b(?P<nd>\d{{1,2}})/(?P<nm>\d{{1,2}})/(?P<ny>\d{{4}}|\d{{2}})\b
+    | \b(?P<td>\d{{1,2}})(?:\s+de)?\s+(?P<tm>{_MONTH})\b\.?(?:\s+de)?,?\s+(?P<ty>\d{{4}})\b
+""", re.VERBOSE)
+
+# Start of a range sharing month/year with the date after it: "15 e ", "15/11 - ", "08, "
+# A bare "15 - " is left to the model: "Etapa 2 - 15/11/2025" is as likely as a range
+_HEAD = re.compile(rf"""
+    \b(?P<d>\d{{1,2}})
+    (?: (?:/(?P<m>\d{{1,2}})|(?:\s+de)?\s+(?P<tm>{_MONTH})\b\.?) \s*(?:,|e|a|ao|ate|-|–)
+      | \s*(?:,|(?:e|a|ao|ate)\b) )
+    \s*$
+""", re.VERBOSE)
+
+# Between the two ends of a range: "16/11/2025 até 17/11/2025"
+_GAP = re.compile(r'^\s*(?:,|e|a|ao|ate|-|–)?\s*$')
+_AMBIGUOUS = re.compile(r'\b\d{1,2}\s*[-–]\s*$')
+
+MAX_DAYS = 31
+
+_TIME = re.compile(r'\b\d{1,2}(?::|h)\d{2}\b|\b\d{1,2}h\b')
+
+
+def _full(m: re.Match) -> Optional[date]:
+    try:
+        if m['iy']:
+            return date(int(m['iy']), int(m['im']), int(m['id']))
+        if m['nd']:
+            year = int(m['ny'])
+            return date(year + 2000 if year < 100 else year, int(m['nm']), int(m['nd']))
+        return date(int(m['ty']), MONTHS[m['tm']], int(m['td']))
+    except ValueError:
+        return None
+
+
+def _head(text: str, end: date) -> Tuple[Optional[date], str]:
+    """ Earliest day of a list/range written before the full end date, and what precedes it """
+    start = None
+    while m := _HEAD.search(text):
+        month = int(m['m']) if m['m'] else MONTHS[m['tm']] if m['tm'] else end.month
+        try:
+            start = date(end.year, month, int(m['d']))
+        except ValueError:
+            return start, text
+        if start > end: # 30/12 a 02/01/2026
+            start = start.replace(year=end.year - 1)
+        text = text[:m.start()]
+    return start, text
+
+
+def parse_dates(date_raw: str) -> Optional[Tuple[date, date]]:
+    """ (start, end) of a Portuguese date or date range; None when not understood """
+    text = _TIME.sub(' ', unaccent(date_raw))
+    matches = [(m, d) for m in _FULL.finditer(text) if (d := _full(m))]
+    if not matches or len(matches) > 2:
+        return None
+    (first, start), (last, end) = matches[0], matches[-1]
+    if first is not last and not _GAP.match(text[first.end():last.start()]):
+        return None # Unrelated dates, e.g. registration deadline and race day
+    head, before = _head(text[:first.start()], start)
+    if _AMBIGUOUS.search(before):
+        return None
+    start = head or start
+    if not (2000 <= start.year <= 2100) or not (0 <= (end - start).days <= MAX_DAYS):
+        return None
+    return start, end
+
+
+def parse_date(date_raw: str) -> Optional[date]:
+    dates = parse_dates(date_raw)
+    return dates[0] if dates else None
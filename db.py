@@ -1,17 +1,29 @@
 import duckdb
 from pathlib import Path
+from typing import List
+
+from decouple import config
 
 from bronze import RawEvent
 
 
+# What the resolvers read from a raw event; a change is worth another try
+_INPUT_HASH = "md5(concat_ws(chr(31), r.title, r.local, r.date, r.sport))"
+
+
 class Persistence:
 
     BASE = Path(__file__).parent / 'data'
 
+    # Low-quality events: exponential backoff between retries, capped attempts
+    REPROCESS_MAX_ATTEMPTS = config('REPROCESS_MAX_ATTEMPTS', default=5, cast=int)
+    REPROCESS_BACKOFF_HOURS = config('REPROCESS_BACKOFF_HOURS', default=24, cast=int)
+
     def __init__(self):
         self.CONN = duckdb.connect(str(self.BASE / 'events.duckdb'))
 
-    def _store_data(self, table: str, jsonlfile: Path):
+    def _store_data(self, table: str, jsonlfile: Path, newer_only: bool = False):
+        """ newer_only: a matched row is only replaced by one crawled at or after it """
 
         if not table.isidentifier():
             raise ValueError(f"Invalid table name: {table}")
@@ -32,7 +44,7 @@ class Persistence:
                 QUALIFY ROW_NUMBER() OVER (PARTITION BY url ORDER BY crawled_at DESC) = 1
             ) AS s
             ON t.url = s.url
-            WHEN MATCHED THEN
+            WHEN MATCHED{' AND s.crawled_at >= t.crawled_at' if newer_only else ''} THEN
                 UPDATE SET *
             WHEN NOT MATCHED THEN
                 INSERT *;
@@ -50,8 +62,18 @@ class Persistence:
     def _vacuum(self):
         self.CONN.execute("VACUUM")
 
-    def store_raw_events(self, jsonlfile: Path):
-        return self._store_data('raw_events', jsonlfile)
+    def store_raw_events(self, jsonlfile: Path, newer_only: bool = False):
+        return self._store_data('raw_events', jsonlfile, newer_only)
+
+    def load_latest_events(self, urls: List[str]):
+        """ Newest raw_events row of each url """
+        rows = self.CONN.execute("""
+        SELECT * FROM raw_events
+        WHERE url IN (SELECT UNNEST(?::VARCHAR[]))
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY url ORDER BY crawled_at DESC) = 1
+        """, [sorted(set(urls))]).fetchall()
+        cols = [c[0] for c in self.CONN.description]
+        return [dict(zip(cols, row)) for row in rows]
 
     def load_all_events(self):
         rows = self.CONN.execute("SELECT * FROM raw_events").fetchall()
@@ -75,22 +97,75 @@ class Persistence:
             d.pop('rn', None)
         return data
 
-    def load_low_quality_events(self):
-        rows = self.CONN.execute("""
-        SELECT r.* FROM (
-            SELECT r.*, ROW_NUMBER() OVER (PARTITION BY r.url ORDER BY r.crawled_at DESC) AS rn
+    def _create_attempts(self):
+        self.CONN.execute("""
+        CREATE TABLE IF NOT EXISTS reprocess_attempts (
+            url VARCHAR PRIMARY KEY,
+            input_hash VARCHAR,
+            attempts INTEGER,
+            last_attempt TIMESTAMP,
+            resolver_version INTEGER
+        )
+        """)
+
+    def load_low_quality_events(self, resolver_version: int = 0):
+        """ Future events with no sport or a low-confidence location, worth another try
+
+            Only when the raw input changed since the last attempt (after a
+            backoff doubling from REPROCESS_BACKOFF_HOURS, at most
+            REPROCESS_MAX_ATTEMPTS times) or a newer resolver_version exists.
+        """
+        self._create_attempts()
+        rows = self.CONN.execute(f"""
+        SELECT r.* EXCLUDE (input_hash) FROM (
+            SELECT r.*, {_INPUT_HASH} AS input_hash,
+                ROW_NUMBER() OVER (PARTITION BY r.url ORDER BY r.crawled_at DESC) AS rn
             FROM raw_events r
             JOIN schema_events s ON r.url = s.url
             WHERE (s.sport = '' OR s.location.confidence = 'low')
               AND TRY_CAST(s.date_range->>'start_date' AS DATE) > CURRENT_DATE
-        ) r WHERE rn = 1;
-        """).fetchall()
+        ) r
+        LEFT JOIN reprocess_attempts a ON a.url = r.url
+        WHERE rn = 1 AND (
+            a.url IS NULL
+            OR a.resolver_version < $version
+            OR (a.input_hash <> r.input_hash
+                AND a.attempts < $max_attempts
+                AND a.last_attempt + to_hours(CAST($backoff * pow(2, a.attempts - 1) AS BIGINT)) <= now())
+        );
+        """, {
+            'version': resolver_version,
+            'max_attempts': self.REPROCESS_MAX_ATTEMPTS,
+            'backoff': self.REPROCESS_BACKOFF_HOURS,
+        }).fetchall()
         cols = [c[0] for c in self.CONN.description]
         data = [dict(zip(cols, row)) for row in rows]
         for d in data:
             d.pop('rn', None)
         return data
 
+    def record_attempts(self, urls: List[str], resolver_version: int):
+        """ After processing: input hash of the latest raw event, one more attempt
+
+            A newer resolver_version starts the count over.
+        """
+        if not urls:
+            return
+        self._create_attempts()
+        self.CONN.execute(f"""
+        INSERT INTO reprocess_attempts
+        SELECT r.url, {_INPUT_HASH}, 1, now(), $version
+        FROM raw_events r
+        WHERE r.url IN (SELECT UNNEST($urls::VARCHAR[]))
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY r.url ORDER BY r.crawled_at DESC) = 1
+        ON CONFLICT (url) DO UPDATE SET
+            input_hash = EXCLUDED.input_hash,
+            attempts = CASE WHEN reprocess_attempts.resolver_version < EXCLUDED.resolver_version
+                            THEN 1 ELSE reprocess_attempts.attempts + 1 END,
+            last_attempt = EXCLUDED.last_attempt,
+            resolver_version = EXCLUDED.resolver_version;
+        """, {'version': resolver_version, 'urls': sorted(set(urls))})
+
     def store_schema_events(self, jsonlfile: Path):
         return self._store_data('schema_events', jsonlfile)
 
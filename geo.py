@@ -1,6 +1,10 @@
+import re
 import json
+import unicodedata
+from collections import defaultdict, deque
 from functools import lru_cache
 from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
 
 DB_PATH = Path(__file__).parent / 'data' / 'geo' / 'municipios_ibge.json'
 
@@ -16,3 +20,122 @@ def lookup_ddd(city: str, uf: str) -> str | None:
     if not city or not uf:
         return None
     return _load_db().get((city.strip().lower(), uf.strip().upper()))
+
+
+UFS = {
+    'AC', 'AL', 'AP', 'AM', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 'MT', 'MS', 'MG', 'PA',
+    'PB', 'PR', 'PE', 'PI', 'RJ', 'RN', 'RS', 'RO', 'RR', 'SC', 'SP', 'SE', 'TO',
+}
+
+# Upper case anywhere ("Salto SP"), any case after a separator ("curvelo/mg")
+_UF = re.compile(rf'\b(?:{"|".join(UFS)})\b|(?<=[/-])\s*(?i:{"|".join(UFS)})\b')
+
+
+def unaccent(text: str) -> str:
+    """ Lowercase, no accents """
+    return ''.join(
+        c for c in unicodedata.normalize('NFKD', text.lower())
+        if not unicodedata.combining(c)
+    )
+
+
+def fold(text: str) -> str:
+    """ Accent-free lowercase words separated by single spaces """
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', unaccent(text)).split())
+
+
+class _Automaton:
+    """ Aho-Corasick over whole words: every pattern occurrence in one pass """
+
+    def __init__(self, patterns: Dict[str, Any]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[str]] = [[]]
+        for pattern in patterns:
+            state = 0
+            for ch in f' {pattern} ':
+                if ch not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[state][ch] = len(self._goto) - 1
+                state = self._goto[state][ch]
+            self._out[state].append(pattern)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] += self._out[self._fail[nxt]]
+
+    def find(self, text: str) -> List[Tuple[int, int, str]]:
+        """ (start, end, pattern) in folded text, end exclusive """
+        found, state = [], 0
+        padded = f' {text} '
+        for i, ch in enumerate(padded):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for pattern in self._out[state]:
+                end = i - 1 # drop the padding space; both ends in text coordinates
+                found.append((end - len(pattern) + 1, end + 1, pattern))
+        return found
+
+
+@lru_cache(maxsize=1)
+def _cities() -> Tuple[_Automaton, Dict[str, List[Dict[str, Any]]]]:
+    by_name = defaultdict(list)
+    for e in json.loads(DB_PATH.read_text()):
+        by_name[fold(e['nome'])].append(e)
+    return _Automaton(by_name), by_name
+
+
+def match_location(location_raw: str) -> Optional[Dict[str, Any]]:
+    """ city/uf straight from the IBGE list when the text is unambiguous
+
+        Needs a UF next to a known municipality of that state ("CURVELO/MG",
+        "Extrema - MG", "Salto / SP"); anything else is left to the model.
+    """
+    if not location_raw:
+        return None
+    ufs = [(m.start(), m.group().strip().upper()) for m in _UF.finditer(location_raw)]
+    if not ufs:
+        return None
+
+    automaton, by_name = _cities()
+    text = fold(location_raw)
+    found = automaton.find(text)
+    # Longest match wins: "sao joao" inside "mata de sao joao" is not a city
+    found = [
+        (s, e, p) for s, e, p in found
+        if not any(s2 <= s and e <= e2 and (s2, e2) != (s, e) for s2, e2, _ in found)
+    ]
+
+    folded_ufs = {fold(uf): uf for _, uf in ufs}
+    candidates = {
+        (e['nome'], e['uf']): (start, end, e)
+        for start, end, pattern in found
+        for e in by_name[pattern] if e['uf'] in folded_ufs.values()
+    }
+    if len(candidates) > 1:
+        # Several cities of the state: keep the one written right before its UF
+        candidates = {
+            k: v for k, v in candidates.items()
+            if re.match(rf'^\s*{fold(k[1])}\b', text[v[1]:])
+        }
+    if len(candidates) != 1:
+        return None
+
+    (nome, uf), (_, _, e) = candidates.popitem()
+    return {
+        'address': None,
+        'city': nome,
+        'uf': uf,
+        'ddd': str(e['ddd']),
+        'confidence': 'high',
+    }
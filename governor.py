@@ -0,0 +1,81 @@
+import time
+from datetime import date
+from typing import Dict, Any, List, Tuple
+
+from decouple import config
+
+import llm
+from silver import Parser, SchemaEvent
+
+
+class Governor:
+    """ Per-run budget for the silver model pass
+
+        Events resolvable without a model go first, they are free. The
+        rest are queued by urgency, soonest start date first (upcoming,
+        then undated, then past), new events ahead of low-quality retries
+        on the same day. They are processed in waves sized to what is left
+        of the token, USD and wall-time budgets (0 = no limit); once one
+        is spent the remaining events are left for the next run, where
+        they are still new or low-quality.
+    """
+
+    TOKENS = config('LLM_BUDGET_TOKENS', default=0, cast=int)
+    USD = config('LLM_BUDGET_USD', default=0, cast=float)
+    SECONDS = config('LLM_BUDGET_SECONDS', default=0, cast=float)
+    WAVE = config('LLM_BUDGET_WAVE', default=100, cast=int)
+
+    def __init__(self, tokens: int | None = None, usd: float | None = None, seconds: float | None = None):
+        self.tokens = self.TOKENS if tokens is None else tokens
+        self.usd = self.USD if usd is None else usd
+        self.seconds = self.SECONDS if seconds is None else seconds
+        self._started = time.monotonic()
+        _, self._tokens0, self._usd0 = llm.usage.snapshot()
+
+    def spent(self) -> Tuple[int, float, float]:
+        """ (tokens, USD, seconds) since the run started """
+        _, tokens, usd = llm.usage.snapshot()
+        return tokens - self._tokens0, usd - self._usd0, time.monotonic() - self._started
+
+    def left(self) -> float:
+        """ Share of the tightest budget still unspent """
+        caps = (self.tokens, self.usd, self.seconds)
+        return min((1 - spent / cap for spent, cap in zip(self.spent(), caps) if cap), default=1.0)
+
+    @staticmethod
+    def urgency(fields: Dict[str, Any], retry: bool, today: date):
+        date_range = fields['date_range']
+        start = date_range.start_date if date_range else None
+        tier = 1 if start is None else 2 if start < today else 0
+        return tier, start or date.max, retry
+
+    def report(self) -> str:
+        tokens, usd, seconds = self.spent()
+        return f'{tokens} tokens, ${usd:.2f}, {seconds:.0f}s'
+
+    def run(self, parser: Parser, new_events: List[Dict], retries: List[Dict]) -> List[SchemaEvent]:
+        today = date.today()
+        queue = [(parser.prepare(obj), False) for obj in new_events]
+        queue += [(parser.prepare(obj), True) for obj in retries]
+
+        free = [prepared for prepared, _ in queue if not parser.pending(prepared[1])]
+        paid = sorted(
+            ((prepared, retry) for prepared, retry in queue if parser.pending(prepared[1])),
+            key=lambda q: self.urgency(q[0][1], q[1], today))
+        paid = [prepared for prepared, _ in paid]
+
+        done = parser.process_prepared(free) if free else []
+        processed = 0
+        while paid and (left := self.left()) > 0:
+            size, used = self.WAVE, 1 - left
+            if processed and used > 0: # Waves shrink to what the budget still affords
+                size = min(size, max(1, int(left * processed / used)))
+            wave, paid = paid[:size], paid[size:]
+            done += parser.process_prepared(wave)
+            processed += len(wave)
+
+        if paid:
+            print(f'Governor: budget spent ({self.report()}), {len(paid)} events deferred to the next run')
+        else:
+            print(f'Governor: {len(done)} events, {self.report()}')
+        return done
@@ -0,0 +1,115 @@
+import json
+import time
+import random
+import threading
+from pathlib import Path
+from urllib.parse import urlparse
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, Callable, Optional
+
+from decouple import config
+
+
+class CircuitBreaker:
+    """ Per-host failure memory across runs
+
+        After THRESHOLD consecutive failed runs the host is skipped for
+        COOLDOWN; the first run after that is a trial (half-open).
+    """
+
+    THRESHOLD = config('CRAWL_BREAKER_THRESHOLD', default=3, cast=int)
+    COOLDOWN = timedelta(hours=config('CRAWL_BREAKER_COOLDOWN_HOURS', default=72, cast=int))
+
+    def __init__(self, state: Dict[str, Dict[str, Any]]):
+        self._state = state
+
+    def is_open(self, host: str) -> bool:
+        s = self._state.get(host)
+        if not s or not s.get('open_until'):
+            return False
+        return datetime.now() < datetime.fromisoformat(s['open_until'])
+
+    def success(self, host: str):
+        self._state[host] = {'failures': 0, 'open_until': None}
+
+    def failure(self, host: str):
+        s = self._state.setdefault(host, {'failures': 0, 'open_until': None})
+        s['failures'] += 1
+        if s['failures'] >= self.THRESHOLD:
+            s['open_until'] = (datetime.now() + self.COOLDOWN).isoformat()
+
+
+class RunLedger:
+    """ Per-day record of the extract run: data/bronze/runs/<day>.json
+
+            crawler -> {status, events, attempts, output (repo), error, finished_at}
+
+        A crashed or interrupted run resumes from it: crawlers already
+        'done' today are not crawled again. Each crawler is isolated:
+        failures are retried with exponential backoff, then recorded
+        without aborting the others.
+    """
+
+    BASE = Path(__file__).parent / 'data' / 'bronze' / 'runs'
+    RETRIES = config('CRAWL_RETRIES', default=3, cast=int)
+    BACKOFF = config('CRAWL_BACKOFF_SECONDS', default=10, cast=float)
+
+    def __init__(self, day: Optional[date] = None, resume: bool = True):
+        self.BASE.mkdir(parents=True, exist_ok=True)
+        self._fn = self.BASE / f'{(day or date.today()).isoformat()}.json'
+        self._breakers_fn = self.BASE / 'breakers.json'
+        self._lock = threading.Lock()
+        self._runs = json.loads(self._fn.read_text()) if resume and self._fn.exists() else {}
+        breakers = json.loads(self._breakers_fn.read_text()) if self._breakers_fn.exists() else {}
+        self.breaker = CircuitBreaker(breakers)
+        self._breakers = breakers
+
+    def is_done(self, name: str) -> bool:
+        return self._runs.get(name, {}).get('status') == 'done'
+
+    def _record(self, name: str, **entry):
+        with self._lock:
+            self._runs[name] = entry | {'finished_at': datetime.now().isoformat()}
+            self._dump(self._fn, self._runs)
+            self._dump(self._breakers_fn, self._breakers)
+
+    @staticmethod
+    def _dump(fn: Path, obj):
+        tmp = fn.with_suffix('.tmp')
+        tmp.write_text(json.dumps(obj, indent=2, default=str))
+        tmp.replace(fn)
+
+    def run(self, crawler, extract: Callable[[Any], int], output: str | Path = '') -> Optional[int]:
+        """ extract(crawler) with resume, retries and circuit breaking; never raises """
+        name = crawler.__class__.__name__
+        host = urlparse(crawler.URL).netloc
+        output = str(output)
+
+        if self.is_done(name):
+            print(f'{name}: done earlier today, skipping')
+            return self._runs[name]['events']
+
+        if self.breaker.is_open(host):
+            print(f'{name}: circuit open for {host}, skipping')
+            self._record(name, status='skipped', events=0, attempts=0, output=output, error='circuit open')
+            return None
+
+        error = None
+        for attempt in range(1, self.RETRIES + 1):
+            try:
+                events = extract(crawler)
+            except Exception as e:
+                error = f'{type(e).__name__}: {e}'
+                print(f'{name}: attempt {attempt}/{self.RETRIES} failed: {error}')
+                if attempt < self.RETRIES:
+                    time.sleep(self.BACKOFF * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+                continue
+            with self._lock:
+                self.breaker.success(host)
+            self._record(name, status='done', events=events, attempts=attempt, output=output, error=None)
+            return events
+
+        with self._lock:
+            self.breaker.failure(host)
+        self._record(name, status='failed', events=0, attempts=self.RETRIES, output=output, error=error)
+        return None
@@ -0,0 +1,485 @@
+import json
+import time
+import random
+import asyncio
+import weakref
+import threading
+from types import SimpleNamespace
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, Optional, Tuple
+
+import openai
+from openai import OpenAI, AsyncOpenAI
+from pydantic import BaseModel
+from decouple import config
+
+
+class RateLimiter:
+    """ Requests- and tokens-per-minute budget shared by threads and event loops
+
+        Two token buckets refilled continuously; a call books one request and
+        its estimated tokens up front and is told how long to wait. The
+        estimate is settled against the usage the API reports afterwards.
+    """
+
+    def __init__(self, rpm: float, tpm: float):
+        self._lock = threading.Lock()
+        self._rpm, self._tpm = rpm, tpm
+        self._requests, self._tokens = rpm, tpm
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._requests = min(self._rpm, self._requests + elapsed * self._rpm / 60)
+        self._tokens = min(self._tpm, self._tokens + elapsed * self._tpm / 60)
+        self._updated = now
+
+    def reserve(self, tokens: int) -> float:
+        """ Book a call; returns seconds to wait before sending it """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._requests -= 1
+            self._tokens -= tokens
+            wait = max(
+                -self._requests * 60 / self._rpm if self._requests < 0 else 0.0,
+                -self._tokens * 60 / self._tpm if self._tokens < 0 else 0.0,
+            )
+            return max(wait, self._paused_until - now)
+
+    def try_reserve(self, tokens: int) -> bool:
+        """ Book a call only if it can go out right away """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self._paused_until or self._requests < 1 or self._tokens < tokens:
+                return False
+            self._requests -= 1
+            self._tokens -= tokens
+            return True
+
+    def settle(self, estimated: int, actual: int):
+        with self._lock:
+            self._tokens += estimated - actual
+
+    def pause(self, seconds: float):
+        """ 429 from the API: nobody sends anything for a while """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+limiter = RateLimiter(
+    rpm=config('LLM_RPM', default=500, cast=float),
+    tpm=config('LLM_TPM', default=200_000, cast=float),
+)
+
+
+def estimate_tokens(request: Dict[str, Any]) -> int:
+    """ ~4 characters per token for the prompt, plus the completion allowance """
+    prompt = json.dumps(request.get('messages', []), ensure_ascii=False)
+    return len(prompt) // 4 + (request.get('max_tokens') or 256)
+
+
+def _endpoint(client, request: Dict[str, Any]):
+    # Pydantic response formats go through the parsing helper
+    response_format = request.get('response_format')
+    if isinstance(response_format, type) and issubclass(response_format, BaseModel):
+        return client.beta.chat.completions.parse
+    return client.chat.completions.create
+
+
+def _usage(response) -> int:
+    usage = getattr(response, 'usage', None)
+    return getattr(usage, 'total_tokens', 0) or 0
+
+
+# USD per 1M tokens (input, output); keep in step with OpenAI's pricing page.
+# Models missing here, and local/stub backends, count tokens but no dollars
+PRICES = {
+    'gpt-4.1-nano': (0.10, 0.40),
+    'gpt-4.1-mini': (0.40, 1.60),
+    'gpt-4o-mini-search-preview': (0.15, 0.60),
+    'gpt-5.4-mini': (0.75, 4.50),
+}
+
+
+class Usage:
+    """ Tokens and dollars spent by this process, for budgets and reports """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls, self.tokens, self.cost = 0, 0, 0.0
+
+    def add(self, backend: 'Backend', model: str, response):
+        usage = getattr(response, 'usage', None)
+        prompt = getattr(usage, 'prompt_tokens', 0) or 0
+        completion = getattr(usage, 'completion_tokens', 0) or 0
+        price_in, price_out = PRICES.get(model, (0, 0)) if backend.name == 'openai' else (0, 0)
+        with self._lock:
+            self.calls += 1
+            self.tokens += prompt + completion
+            self.cost += (prompt * price_in + completion * price_out) / 1e6
+
+    def snapshot(self) -> Tuple[int, int, float]:
+        """ (calls, tokens, USD) so far """
+        with self._lock:
+            return self.calls, self.tokens, self.cost
+
+
+usage = Usage()
+
+
+class Latency:
+    """ Recent successful call durations per (agent, model) """
+
+    WINDOW = 200
+    MIN_SAMPLES = 20
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=self.WINDOW))
+
+    def record(self, key: Tuple[str, str], seconds: float):
+        with self._lock:
+            self._samples[key].append(seconds)
+
+    def p95(self, key: Tuple[str, str]) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples[key])
+        if len(samples) < self.MIN_SAMPLES:
+            return None
+        return samples[int(len(samples) * 0.95) - 1]
+
+
+latency = Latency()
+
+
+class DeadlineExceeded(TimeoutError):
+    """ The call's deadline passed before any attempt succeeded """
+
+
+# Tail-latency policy: every call has a deadline; transient errors are retried
+# with jittered backoff; a duplicate request is hedged once the first outlives
+# the p95 latency; if all else fails, one last try on the fallback model.
+# Hedged duplicates are billed whether they win or not, so all are accounted
+DEADLINE = config('LLM_DEADLINE_SECONDS', default=60, cast=float)
+RETRIES = config('LLM_RETRIES', default=3, cast=int)
+BACKOFF = config('LLM_BACKOFF_SECONDS', default=1, cast=float)
+HEDGE = config('LLM_HEDGE', default=True, cast=bool)
+FALLBACK_MODEL = config('LLM_FALLBACK_MODEL', default='gpt-4.1-nano')
+
+TRANSIENT = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+    DeadlineExceeded,
+)
+
+
+def _backoff(backend: 'Backend', attempt: int, e: Exception) -> float:
+    if isinstance(e, openai.RateLimitError):
+        try:
+            pause = float(e.response.headers.get('retry-after', 10))
+        except (TypeError, ValueError):
+            pause = 10.0
+        backend.limiter.pause(pause)
+        return pause
+    return BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5)
+
+
+# ── Backends ────────────────────────────────────────────────────────────────
+
+class Backend:
+    """ Where model calls go: OpenAI or any OpenAI-compatible server
+
+        Clients are created on first use; the async one per event loop, since
+        its connections belong to the loop that opened them.
+    """
+
+    def __init__(self, name: str, key: str, base_url: Optional[str] = None, model: Optional[str] = None,
+                 fallback: str = '', limiter: RateLimiter = limiter, cache: bool = True,
+                 key_default: Optional[str] = None, own_models: bool = False):
+        self.name, self.key, self.key_default, self.base_url = name, key, key_default, base_url
+        self.model, self.fallback, self.limiter, self.cache = model, fallback, limiter, cache
+        # Serves its own models: the agents' OpenAI model names mean nothing there
+        self.own_models = own_models
+        self._lock = threading.Lock()
+        self._client = None
+        self._aclients = weakref.WeakKeyDictionary()
+
+    def _kwargs(self) -> Dict[str, Any]:
+        # Retries are ours (jittered, under the rate limits), not the SDK's
+        key = config(self.key) if self.key_default is None else config(self.key, default=self.key_default)
+        return dict(api_key=key, base_url=self.base_url, max_retries=0)
+
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = OpenAI(**self._kwargs())
+            return self._client
+
+    def aclient(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self._aclients:
+            self._aclients[loop] = AsyncOpenAI(**self._kwargs())
+        return self._aclients[loop]
+
+    def tag(self, model: str) -> str:
+        """ Model name as cached: answers from different backends never mix """
+        return model if self.name == 'openai' else f'{self.name}/{model}'
+
+
+def _stub_response(request: Dict[str, Any]):
+    response_format = request.get('response_format')
+    parsed = None
+    if isinstance(response_format, type) and issubclass(response_format, BaseModel):
+        # Batch envelopes (a required list) come back empty
+        parsed = response_format.model_validate(
+            {k: [] for k, f in response_format.model_fields.items() if f.is_required()})
+    message = SimpleNamespace(content=parsed.model_dump_json() if parsed else '', parsed=parsed, tool_calls=None)
+    return SimpleNamespace(
+        model=request['model'],
+        choices=[SimpleNamespace(message=message, finish_reason='stop')],
+        usage=SimpleNamespace(prompt_tokens=0, completion_tokens=0, total_tokens=0),
+    )
+
+
+class _StubClient:
+    """ chat.completions.create / beta.chat.completions.parse, answered in-process """
+
+    def __init__(self, asynchronous: bool):
+        completions = SimpleNamespace(create=self._acreate if asynchronous else self._create)
+        completions.parse = completions.create
+        self.chat = SimpleNamespace(completions=completions)
+        self.beta = SimpleNamespace(chat=self.chat)
+
+    def _create(self, **request):
+        return _stub_response(request)
+
+    async def _acreate(self, **request):
+        return _stub_response(request)
+
+
+class Stub(Backend):
+    """ Deterministic and offline: every field null, every confidence low
+
+        For runs and tests that must not depend on a model; never cached.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name, key='', limiter=RateLimiter(rpm=1e9, tpm=1e12), cache=False)
+
+    def client(self):
+        return _StubClient(asynchronous=False)
+
+    def aclient(self):
+        return _StubClient(asynchronous=True)
+
+
+BACKENDS = {
+    'openai': Backend('openai', key='OPENAI_API_KEY', fallback=FALLBACK_MODEL),
+    # llama.cpp, vLLM, Ollama... any server speaking the chat completions API
+    'local': Backend(
+        'local',
+        key='LLM_LOCAL_API_KEY',
+        key_default='unused', # llama.cpp and vLLM accept any key unless started with one
+        own_models=True,
+        base_url=config('LLM_LOCAL_URL', default='http://localhost:8080/v1'),
+        model=config('LLM_LOCAL_MODEL', default=None),
+        fallback=config('LLM_LOCAL_FALLBACK_MODEL', default=''),
+        limiter=RateLimiter(
+            rpm=config('LLM_LOCAL_RPM', default=6000, cast=float),
+            tpm=config('LLM_LOCAL_TPM', default=10_000_000, cast=float),
+        ),
+    ),
+    'stub': Stub('stub'),
+}
+
+BACKEND = config('LLM_BACKEND', default='openai')
+
+
+def route(task: str, model: Optional[str] = None, default: Optional[str] = None) -> Tuple[Backend, str]:
+    """ Backend and model for a task
+
+        LLM_BACKEND_<TASK> and LLM_MODEL_<TASK> (e.g. LLM_BACKEND_NORMALIZE_DATERANGE=local)
+        override LLM_BACKEND and the backend's or the agent's default model;
+        a model passed explicitly wins. The local backend never falls back
+        to the agent's default (an OpenAI model name).
+    """
+    name = config(f'LLM_BACKEND_{task.upper()}', default=BACKEND)
+    if name not in BACKENDS:
+        raise ValueError(f'{task}: unknown LLM backend {name!r}, expected one of {", ".join(BACKENDS)}')
+    backend = BACKENDS[name]
+    model = model or config(f'LLM_MODEL_{task.upper()}', default=backend.model)
+    if model is None and backend.own_models:
+        raise ValueError(f'{task}: routed to the {name} backend, set LLM_LOCAL_MODEL or LLM_MODEL_{task.upper()}')
+    return backend, model or default
+
+
+def fallback(backend: Backend, task: str, model: str) -> str:
+    """ Model to retry a failed task on, '' for none
+
+        LLM_FALLBACK_<TASK> overrides the backend's fallback. On OpenAI it is
+        only used when PRICES show it cheaper than the model that failed; a
+        local fallback costs nothing and is taken as configured.
+    """
+    name = config(f'LLM_FALLBACK_{task.upper()}', default=backend.fallback)
+    if not name or name == model:
+        return ''
+    if backend.name == 'openai':
+        if name not in PRICES or model not in PRICES or sum(PRICES[name]) >= sum(PRICES[model]):
+            return ''
+    return name
+
+
+def _account(backend: Backend, request: Dict[str, Any], tokens: int, response):
+    """ Settle a call's reservation and count what it was billed """
+    backend.limiter.settle(tokens, _usage(response))
+    usage.add(backend, request['model'], response)
+
+
+def _account_later(backend: Backend, request: Dict[str, Any], tokens: int, future):
+    """ A losing hedge is billed too: account it whenever it finishes """
+    def done(f):
+        if not f.cancelled() and f.exception() is None:
+            _account(backend, request, tokens, f.result())
+    future.add_done_callback(done)
+
+
+def _hedge_at(name: str, request: Dict[str, Any], timeout: float) -> Optional[float]:
+    p95 = latency.p95((name, request['model']))
+    return p95 if HEDGE and p95 is not None and p95 < timeout else None
+
+
+# ── Sync ────────────────────────────────────────────────────────────────────
+
+_hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='llm-hedge')
+
+
+def _send(backend: Backend, name: str, request: Dict[str, Any], tokens: int, timeout: float):
+    call = lambda t: _endpoint(backend.client(), request)(**request, timeout=t)
+    start = time.monotonic()
+    hedge_at = _hedge_at(name, request, timeout)
+    if hedge_at is None:
+        response = call(timeout)
+    else:
+        # Every call holds a reservation of `tokens`: the first from _attempts, the hedge from try_reserve
+        pending = {_hedge_pool.submit(call, timeout)}
+        done, _ = wait(pending, timeout=hedge_at)
+        if not done and backend.limiter.try_reserve(tokens):
+            print(f'{name}: slower than p95 ({hedge_at:.1f}s), hedging')
+            pending.add(_hedge_pool.submit(call, timeout - hedge_at))
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            ok = [f for f in done if f.exception() is None]
+            if ok:
+                response = ok[0].result()
+                for f in pending | done - {ok[0]}:
+                    _account_later(backend, request, tokens, f)
+                break
+            error = next(iter(done)).exception()
+        else:
+            raise error
+    _account(backend, request, tokens, response)
+    latency.record((name, request['model']), time.monotonic() - start)
+    return response
+
+
+def _attempts(backend: Backend, name: str, request: Dict[str, Any], retries: int):
+    tokens = estimate_tokens(request)
+    deadline = time.monotonic() + DEADLINE
+    for attempt in range(retries + 1):
+        time.sleep(backend.limiter.reserve(tokens))
+        remaining = deadline - time.monotonic()
+        try:
+            if remaining <= 0:
+                raise DeadlineExceeded(f'{name}: {DEADLINE}s deadline')
+            return _send(backend, name, request, tokens, remaining)
+        except TRANSIENT as e:
+            if attempt == retries or isinstance(e, DeadlineExceeded):
+                raise
+            pause = _backoff(backend, attempt, e)
+            print(f'{name}: {type(e).__name__}, retry {attempt + 1}/{retries} in {pause:.1f}s')
+            time.sleep(min(pause, max(0, deadline - time.monotonic())))
+
+
+def complete(backend: Backend, name: str, request: Dict[str, Any]) -> Tuple[Any, str]:
+    """ One chat completion under the tail-latency policy; returns (response, model used) """
+    try:
+        response = _attempts(backend, name, request, RETRIES)
+    except TRANSIENT as e:
+        if not (model := fallback(backend, name, request['model'])):
+            raise
+        print(f'{name}: {type(e).__name__} on {request["model"]}, falling back to {model}')
+        request = request | {'model': model}
+        response = _attempts(backend, name, request, 0)
+    print(f'{name}:', request['model'], response.usage)
+    return response, request['model']
+
+
+# ── Async ───────────────────────────────────────────────────────────────────
+
+async def _asend(backend: Backend, name: str, request: Dict[str, Any], tokens: int, timeout: float):
+    aclient = backend.aclient()
+    call = lambda t: asyncio.ensure_future(_endpoint(aclient, request)(**request, timeout=t))
+    start = time.monotonic()
+    hedge_at = _hedge_at(name, request, timeout)
+    pending = {call(timeout)}
+    try:
+        if hedge_at is not None:
+            done, _ = await asyncio.wait(pending, timeout=hedge_at)
+            if not done and backend.limiter.try_reserve(tokens):
+                print(f'{name}: slower than p95 ({hedge_at:.1f}s), hedging')
+                pending.add(call(timeout - hedge_at))
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            ok = [t for t in done if t.exception() is None]
+            if ok:
+                # The loser is billed anyway: let it finish and account it
+                for task in pending | done - {ok[0]}:
+                    _account_later(backend, request, tokens, task)
+                pending = set()
+                _account(backend, request, tokens, ok[0].result())
+                latency.record((name, request['model']), time.monotonic() - start)
+                return ok[0].result()
+            error = next(iter(done)).exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def _aattempts(backend: Backend, name: str, request: Dict[str, Any], retries: int):
+    tokens = estimate_tokens(request)
+    deadline = time.monotonic() + DEADLINE
+    for attempt in range(retries + 1):
+        await asyncio.sleep(backend.limiter.reserve(tokens))
+        remaining = deadline - time.monotonic()
+        try:
+            if remaining <= 0:
+                raise DeadlineExceeded(f'{name}: {DEADLINE}s deadline')
+            return await _asend(backend, name, request, tokens, remaining)
+        except TRANSIENT as e:
+            if attempt == retries or isinstance(e, DeadlineExceeded):
+                raise
+            pause = _backoff(backend, attempt, e)
+            print(f'{name}: {type(e).__name__}, retry {attempt + 1}/{retries} in {pause:.1f}s')
+            await asyncio.sleep(min(pause, max(0, deadline - time.monotonic())))
+
+
+async def acomplete(backend: Backend, name: str, request: Dict[str, Any]) -> Tuple[Any, str]:
+    try:
+        response = await _aattempts(backend, name, request, RETRIES)
+    except TRANSIENT as e:
+        if not (model := fallback(backend, name, request['model'])):
+            raise
+        print(f'{name}: {type(e).__name__} on {request["model"]}, falling back to {model}')
+        request = request | {'model': model}
+        response = await _aattempts(backend, name, request, 0)
+    print(f'{name}:', request['model'], response.usage)
+    return response, request['model']
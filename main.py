@@ -1,9 +1,16 @@
+import sys
 from pprint import pprint
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+from decouple import config
 
 from cronos import *
 from aggregators import *
-from bronze import BronzeLayer
+from bronze import BronzeLayer, BronzeSink
+from ledger import RunLedger
 from silver import SilverLayer, Parser
+from governor import Governor
 
 from itertools import chain
 flatten = chain.from_iterable
@@ -30,16 +37,18 @@ crawlers = [
     # FpcParana(), # WIP
 ]
 
-def extract():
-    all_events = []
-    for crawler in crawlers:
-        events = crawler.trigger()
-        BronzeLayer.store_jsonl(events, crawler.REPO)
-        all_events += events
-        print(crawler, "Done!")
+# Sources live on different hosts; politeness is enforced per host by HostScheduler
+CRAWL_WORKERS = config('CRAWL_WORKERS', default=len(crawlers), cast=int)
+
+def _extract_one(sink, ledger, crawler):
+    count = ledger.run(crawler, sink.consume, output=str(crawler.REPO))
+    print(crawler, "Done!" if count is not None else "Failed!", count)
 
-    jsonlfile = BronzeLayer.store_jsonl(all_events)
-    BronzeLayer.store_db(jsonlfile)
+def extract(workers: int = CRAWL_WORKERS, resume: bool = True):
+    """ resume=False re-crawls every source, ignoring today's ledger """
+    ledger = RunLedger(resume=resume)
+    with BronzeSink(append=resume) as sink, ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        list(pool.map(partial(_extract_one, sink, ledger), crawlers))
 
 def load():
     """ File-based alternative:
@@ -52,24 +61,43 @@ def load():
     # Upgrade to Silver
     parser.aggregate_jsonl(agg)
 
-from agents import SPORTS
+from sports import SPORTS
 RELEVANT_SPORTS = set(SPORTS.values()) | {''}  # '' = crawlers that don't set sport pass through unchanged
 
+def _new_events():
+    return [obj for obj in BronzeLayer.load_new_events() if obj['sport'] in RELEVANT_SPORTS]
+
+def _low_quality_events():
+    return BronzeLayer.load_low_quality_events(Parser.RESOLVER_VERSION)
+
+def _pending_events():
+    return _new_events() + _low_quality_events()
+
 def load_v2():
     parser = Parser()
+    parser.collect_batches() # Answers of last night's batch job, if any
 
-    agg = []
-    for obj in BronzeLayer.load_new_events():
-        if obj['sport'] not in RELEVANT_SPORTS:
-            continue
-        agg.append(parser.process(obj))
-
-    for obj in BronzeLayer.load_low_quality_events():
-        agg.append(parser.process(obj))
+    # Most urgent first, within LLM_BUDGET_*; the rest waits for the next run
+    agg = Governor().run(parser, _new_events(), _low_quality_events())
 
     jsonlfile = SilverLayer().store_jsonl(agg)
     if agg:
         SilverLayer.store_db(jsonlfile)
+        BronzeLayer.record_attempts([e.url for e in agg], Parser.RESOLVER_VERSION)
+
+def submit_nightly():
+    """ Queue the backlog on the Batch API; the next load_v2 reads the answers from cache
+
+        Run after load_v2 (update.sh: main.py --submit-batch), so only what
+        the Governor deferred is queued. Skipped while a job is still out,
+        it would be billed twice for the same events.
+    """
+    parser = Parser()
+    parser.collect_batches()
+    if any(Parser.BATCHES.glob('*.json')):
+        print('Batch: previous job still running, nothing submitted')
+        return
+    print('Batch:', parser.submit_batch(_pending_events()))
 
 def publish():
     from gold import GoldLayer
@@ -78,6 +106,9 @@ def publish():
     events = schema_events.fetchall()
 
 if __name__ == "__main__":
+    if '--submit-batch' in sys.argv:
+        submit_nightly()
+        sys.exit(0)
     print("Hello from xcmagg!") 
     extract()
     load_v2()
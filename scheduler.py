@@ -0,0 +1,175 @@
+import time
+import threading
+from pathlib import Path
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+from typing import Dict, Optional
+
+from decouple import config
+
+
+class Disallowed(Exception):
+    """ robots.txt forbids the URL """
+
+
+@dataclass
+class _Host:
+    rate: float                 # requests per second, adapted
+    ceiling: float              # never faster than this (robots Crawl-delay)
+    burst: float
+    tokens: float
+    updated: float
+    robots: Optional[RobotFileParser] = None
+    paused_until: float = 0.0
+    latency: Optional[float] = None
+
+
+class HostScheduler:
+    """ Per-host politeness shared by every crawler thread and event loop
+
+        - robots.txt is fetched once per host, through the crawler's own
+          session, and cached on disk for a day: Crawl-delay caps the rate
+          and Disallow rules are enforced
+        - each host gets a token bucket; the rate is adapted AIMD-style:
+          additive increase on fast answers, multiplicative decrease when
+          latency degrades or the server pushes back (429/503, Retry-After)
+    """
+
+    ROBOTS_DIR = Path(__file__).parent / 'data' / 'bronze' / 'robots'
+    ROBOTS_TTL = 24 * 3600
+    RESPECT_ROBOTS = config('CRAWL_RESPECT_ROBOTS', default=True, cast=bool)
+
+    START_RATE = config('CRAWL_START_RATE', default=1.0, cast=float)
+    MAX_RATE = config('CRAWL_MAX_RATE', default=4.0, cast=float)
+    MIN_RATE = config('CRAWL_MIN_RATE', default=0.05, cast=float)
+    BURST = 2.0
+    INCREASE = 0.1      # req/s added per fast answer
+    DECREASE = 0.5      # rate factor on 429/503
+    SLOWDOWN = 0.8      # rate factor when latency degrades
+    SLOW_FACTOR = 3.0   # "degraded": latency above this multiple of its average
+    PUSHBACK = {429, 503}
+
+    _lock = threading.Lock()
+    _hosts: Dict[str, _Host] = {}
+    _robots_locks: Dict[str, threading.Lock] = {}
+
+    # ── robots.txt ──────────────────────────────────────────────────────────
+
+    @classmethod
+    def _robots(klass, scheme: str, host: str, impersonate: str | None = None,
+                headers: Dict[str, str] | None = None) -> Optional[RobotFileParser]:
+        from bronze import SessionPool
+        klass.ROBOTS_DIR.mkdir(parents=True, exist_ok=True)
+        fn = klass.ROBOTS_DIR / f'{host}.txt'
+        if not fn.exists() or time.time() - fn.stat().st_mtime > klass.ROBOTS_TTL:
+            url = f'{scheme}://{host}/robots.txt'
+            try:
+                r = SessionPool.get(url, impersonate).get(url, timeout=10, **({'headers': headers} if headers else {}))
+                status = r.status_code
+            except OSError as e:
+                r, status = None, e
+            # RFC 9309 2.3.1.3: any 4xx, 401/403 included, means no robots.txt, crawl freely
+            if status == 200:
+                fn.write_text(r.text)
+            elif isinstance(status, int) and 400 <= status < 500:
+                fn.write_text('')
+            else: # 5xx or network error: transient, keep the last copy, cache nothing
+                print(f'robots.txt unavailable for {host}: {status}')
+                if not fn.exists():
+                    return None
+        rp = RobotFileParser()
+        rp.parse(fn.read_text().splitlines())
+        return rp
+
+    @classmethod
+    def _host(klass, endpoint: str, impersonate: str | None = None,
+              headers: Dict[str, str] | None = None) -> _Host:
+        """ impersonate/headers: how the first caller for the host fetches robots.txt """
+        u = urlparse(endpoint)
+        with klass._lock:
+            if u.netloc in klass._hosts:
+                return klass._hosts[u.netloc]
+            host_lock = klass._robots_locks.setdefault(u.netloc, threading.Lock())
+
+        with host_lock:
+            with klass._lock:
+                if u.netloc in klass._hosts:
+                    return klass._hosts[u.netloc]
+            robots = klass._robots(u.scheme or 'https', u.netloc, impersonate, headers)
+            delay = robots and robots.crawl_delay('*')
+            ceiling = min(klass.MAX_RATE, 1 / float(delay)) if delay else klass.MAX_RATE
+            if robots and delay:
+                print(f'{u.netloc}: Crawl-delay {delay}s')
+            state = _Host(
+                rate=min(klass.START_RATE, ceiling), ceiling=ceiling,
+                burst=1.0 if delay else klass.BURST, tokens=1.0,
+                updated=time.monotonic(), robots=robots)
+            with klass._lock:
+                klass._hosts[u.netloc] = state
+            return state
+
+    @classmethod
+    def check(klass, url: str, impersonate: str | None = None, headers: Dict[str, str] | None = None):
+        """ Raise Disallowed if robots.txt forbids the URL """
+        h = klass._host(url, impersonate, headers)
+        if klass.RESPECT_ROBOTS and h.robots and not h.robots.can_fetch('*', url):
+            raise Disallowed(f'robots.txt disallows {url}')
+
+    # ── Token bucket ────────────────────────────────────────────────────────
+
+    @classmethod
+    def reserve(klass, endpoint: str, impersonate: str | None = None,
+                headers: Dict[str, str] | None = None) -> float:
+        """ Take a token for the host; returns seconds to wait before the request """
+        klass.check(endpoint, impersonate, headers)
+        h = klass._host(endpoint)
+        with klass._lock:
+            now = time.monotonic()
+            h.tokens = min(h.burst, h.tokens + (now - h.updated) * h.rate)
+            h.updated = now
+            h.tokens -= 1
+            wait = -h.tokens / h.rate if h.tokens < 0 else 0.0
+            return max(wait, h.paused_until - now)
+
+    @classmethod
+    def wait(klass, endpoint: str, impersonate: str | None = None, headers: Dict[str, str] | None = None):
+        time.sleep(klass.reserve(endpoint, impersonate, headers))
+
+    # ── Adaptation ──────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _retry_after(value: Optional[str]) -> Optional[float]:
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            pass
+        try:
+            return (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+
+    @classmethod
+    def observe(klass, endpoint: str, status: Optional[int], latency: float,
+                retry_after: Optional[str] = None) -> bool:
+        """ Feed back one response (status None: network error); True means retry it """
+        h = klass._host(endpoint)
+        host = urlparse(endpoint).netloc
+        with klass._lock:
+            if status in klass.PUSHBACK or status is None:
+                h.rate = max(klass.MIN_RATE, h.rate * klass.DECREASE)
+                pause = klass._retry_after(retry_after) or 1 / h.rate
+                h.paused_until = max(h.paused_until, time.monotonic() + pause)
+                print(f'{host}: {status or "error"}, slowing to {h.rate:.2f} req/s, pausing {pause:.0f}s')
+                return True
+
+            if h.latency is not None and latency > klass.SLOW_FACTOR * h.latency and latency > 1:
+                h.rate = max(klass.MIN_RATE, h.rate * klass.SLOWDOWN)
+            else:
+                h.rate = min(h.ceiling, h.rate + klass.INCREASE)
+            h.latency = latency if h.latency is None else 0.8 * h.latency + 0.2 * latency
+            return False
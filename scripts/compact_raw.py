@@ -0,0 +1,59 @@
+"""
+Maintenance: move the raw archive into the content-addressed zstd store.
+
+For every data/bronze/<repo>/raw directory:
+  1. Train a zstd dictionary on a sample of that source's pages
+  2. Replace each legacy plain file by a pointer to its compressed blob
+
+Identical pages collapse into a single blob. File mtimes are preserved,
+since Extractor.crawled_at() reads them.
+
+Before: raw/2025-11-01-home.html   (48 KB of HTML)
+After:  raw/2025-11-01-home.html   ("xcmagg-blob sha256:ab12...")
+        raw/blobs/ab/ab12....zst   (~3 KB, shared by every identical day)
+
+Usage:
+  uv run python3 scripts/compact_raw.py              # all repos
+  uv run python3 scripts/compact_raw.py peloto.com.br # one repo
+"""
+import os
+import sys
+import random
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from cache import BlobStore, Manifest
+
+BRONZE = Path(__file__).parent.parent / 'data' / 'bronze'
+SAMPLES = 500
+
+repos = [BRONZE / name / 'raw' for name in sys.argv[1:]] or sorted(BRONZE.glob('*/raw'))
+
+for raw in repos:
+    store = BlobStore.open(raw)
+    legacy = [
+        fp for fp in raw.iterdir()
+        if Manifest.RAW_NAME.match(fp.name) and fp.is_file()
+        and BlobStore.pointer_sha(fp.read_bytes()) is None
+    ]
+    if not legacy:
+        print(f"{raw}: nothing to compact")
+        continue
+
+    # ── Dictionary ───────────────────────────────────────────────────────────
+    sample = random.sample(legacy, min(SAMPLES, len(legacy)))
+    dict_id = store.train_dictionary([fp.read_bytes() for fp in sample])
+    print(f"{raw}: dictionary {dict_id} from {len(sample)} pages")
+
+    # ── Compact ──────────────────────────────────────────────────────────────
+    before = 0
+    for fp in legacy:
+        stat = fp.stat()
+        before += stat.st_size
+        store.write(fp, fp.read_bytes())
+        os.utime(fp, (stat.st_atime, stat.st_mtime))
+
+    blobs = list((raw / BlobStore.DIR).glob('*/*.zst'))
+    after = sum(b.stat().st_size for b in blobs)
+    print(f"{raw}: {len(legacy)} files, {before / 1e6:.1f} MB → {len(blobs)} blobs, {after / 1e6:.1f} MB")
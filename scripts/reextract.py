@@ -0,0 +1,59 @@
+"""
+Re-run a crawler's extractors over its archived raw pages, without network.
+
+Use after fixing an Extractor: every archived day in the range is
+replayed in a process pool, the per-day bronze JSONL is rewritten and
+the corrected events are merged into raw_events in one load. Replayed
+events never replace a row crawled after them, so the range must run
+through today for events still listed to be fixed.
+
+The affected events are then parsed again from their newest raw_events
+row and merged into schema_events; gold picks them up on the next run.
+
+Example: after fixing a TicketBr title extractor
+  uv run python3 scripts/reextract.py TicketBr 2025-10-01 2026-10-17
+
+Usage:
+  uv run python3 scripts/reextract.py <Crawler> <start YYYY-MM-DD> <end YYYY-MM-DD> [workers]
+"""
+import json
+import sys
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import cronos
+import aggregators
+from bronze import BronzeLayer
+from silver import Parser, SilverLayer
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 4:
+        print(__doc__)
+        sys.exit(1)
+
+    name, start, end = sys.argv[1:4]
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 else None
+
+    crawler_cls = getattr(cronos, name, None) or getattr(aggregators, name, None)
+    if crawler_cls is None:
+        print(f"Unknown crawler: {name}")
+        sys.exit(1)
+
+    # ── Bronze ──
+    fn = BronzeLayer.reextract(crawler_cls, date.fromisoformat(start), date.fromisoformat(end), workers)
+    print(f"Bronze: {fn}")
+
+    # ── Silver ──
+    urls = [json.loads(line)['url'] for line in fn.read_text().splitlines()] if fn.exists() else []
+    events = BronzeLayer.load_latest_events(urls) if urls else []
+    if not events:
+        print("Nothing to parse")
+        sys.exit(0)
+
+    schema_events = Parser().process_many(events)
+    out = SilverLayer.store_jsonl(schema_events, name=fn.stem)
+    SilverLayer.store_db(out)
+    print(f"Silver: {len(schema_events)} events, {out}")
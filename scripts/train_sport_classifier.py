@@ -0,0 +1,56 @@
+"""
+Train the local sport classifier (sports.SportModel) from schema_events.
+
+Every event already classified into one of the canonical sports is a
+labeled sample: "<title> <local>" → sport. A random 10% is held out to
+report accuracy and how many events clear SPORT_MODEL_THRESHOLD, i.e. how
+many classify_sport calls the model would save.
+
+Output: data/models/sport_nb.json, loaded by Parser.sport on the next run.
+
+Usage:
+  uv run python3 scripts/train_sport_classifier.py
+"""
+import sys
+import random
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from db import Persistence
+from sports import CANONICAL, MODEL_THRESHOLD, SportModel
+
+HOLDOUT = 0.1
+
+# ── Samples ──────────────────────────────────────────────────────────────────
+rows = Persistence().CONN.execute("""
+    SELECT s.title || ' ' || COALESCE(r.local, ''), s.sport
+    FROM schema_events s
+    LEFT JOIN (
+        SELECT url, local FROM raw_events
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY url ORDER BY crawled_at DESC) = 1
+    ) r ON r.url = s.url
+    WHERE s.sport IN (SELECT UNNEST(?::VARCHAR[]))
+""", [CANONICAL]).fetchall()
+
+random.seed(0)
+random.shuffle(rows)
+cut = int(len(rows) * HOLDOUT)
+test, train = rows[:cut], rows[cut:]
+print(f"{len(rows)} labeled events: {len(train)} train, {len(test)} held out")
+
+# ── Evaluate ─────────────────────────────────────────────────────────────────
+model = SportModel.train(train)
+confident = correct = 0
+for text, sport in test:
+    predicted, p = model.predict(text)
+    if p >= MODEL_THRESHOLD:
+        confident += 1
+        correct += predicted == sport
+if test:
+    print(f"Above threshold {MODEL_THRESHOLD}: {confident}/{len(test)}, "
+          f"accuracy {correct / max(confident, 1):.1%}")
+
+# ── Save (all samples) ───────────────────────────────────────────────────────
+fn = SportModel.train(rows).save()
+print(f"Saved: {fn}")
@@ -1,16 +1,18 @@
 import os
 import json
 import time
+import asyncio
 from pathlib import Path
 from itertools import chain
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
 from datetime import date, datetime, timedelta
 
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List, Optional, Iterator, Tuple
+from typing import Dict, Any, List, Optional, Iterator, Tuple, Callable
 from dataclasses import dataclass, asdict
 
 import jsonlines
+from decouple import config
 
 from bronze import Crawler, RawEvent
 
@@ -85,9 +87,9 @@ class SilverLayer:
         self.BASE.mkdir(parents=True, exist_ok=True)
 
     @classmethod
-    def store_jsonl(klass, event_list: List[SchemaEvent]) -> Path:
+    def store_jsonl(klass, event_list: List[SchemaEvent], name: str | None = None) -> Path:
         today = date.today().isoformat()
-        fn = klass.BASE / f'{today}.jsonl'
+        fn = klass.BASE / f'{name or today}.jsonl'
         with jsonlines.open(fn, mode='w') as fp:
             # TODO: Custom decoder
             objs = [e.to_dict() for e in event_list]
@@ -105,6 +107,10 @@ class SilverLayer:
 
 class Parser:
 
+    # Bump when a resolver gets stronger (prompt, model, local matcher):
+    # low-quality events then get a fresh round of attempts
+    RESOLVER_VERSION = 1
+
     def __init__(self):
         self._location_cache = self._load_location_cache()
 
@@ -129,9 +135,22 @@ class Parser:
     def source(self, raw_event) -> str:
         return raw_event.source
 
-    def date_range(self, raw_event) -> DateRange:
+    # Each field has a local resolver (None when it can't tell) and a model one
+
+    def _date_range_local(self, raw_event) -> Optional[DateRange]:
+        """ Rule-based, the fast path in front of normalize_daterange """
+        from dates import parse_dates
+        dates = parse_dates(raw_event.date)
+        if not dates:
+            return None
+        start, end = dates
+        return DateRange(date_raw=raw_event.date, multi_day=start != end, start_date=start, end_date=end)
+
+    def _date_range_request(self, raw_event):
         from agents import normalize_daterange
-        llm_parsed = normalize_daterange(f'{raw_event.date} {raw_event.title}')
+        return normalize_daterange, f'{raw_event.date} {raw_event.title}'
+
+    def _date_range_result(self, raw_event, llm_parsed) -> DateRange:
         return DateRange(
             multi_day=llm_parsed.multi_day,
             start_date=llm_parsed.start_date,
@@ -139,13 +158,51 @@ class Parser:
             date_raw=raw_event.date,
         )
 
-    def location(self, raw_event) -> Location:
-        from agents import normalize_location, search_event_location
+    def _date_range_model(self, raw_event) -> DateRange:
+        agent, prompt = self._date_range_request(raw_event)
+        return self._date_range_result(raw_event, agent(prompt))
 
-        llm_input = f'{raw_event.title} - Local {raw_event.local}'
+    def date_range(self, raw_event) -> DateRange:
+        return self._date_range_local(raw_event) or self._date_range_model(raw_event)
+
+    def _location_input(self, raw_event) -> str:
+        return f'{raw_event.title} - Local {raw_event.local}'
+
+    def _location_local(self, raw_event) -> Optional[Location]:
+        llm_input = self._location_input(raw_event)
+
+        # Plain "City/UF" locals resolve against the IBGE list, no model call
+        from geo import match_location
+        if matched := match_location(raw_event.local):
+            return Location(location_raw=llm_input, **matched)
 
         if llm_input in self._location_cache:
             return Location(**self._location_cache[llm_input])
+        return None
+
+    def _location_answer(self, llm_input: str, llm_parsed: Dict) -> Location:
+        if not llm_parsed.get('city'):
+            print(f'[no city] {llm_input}')
+            print(f'[no city] {llm_parsed}')
+
+        llm_parsed['location_raw'] = llm_input
+
+        if llm_parsed.get('confidence') in ('medium', 'high'):
+            self._location_cache[llm_input] = llm_parsed
+
+        return Location(**llm_parsed)
+
+    def _location_request(self, raw_event):
+        from agents import normalize_location
+        return normalize_location, self._location_input(raw_event)
+
+    def _location_result(self, raw_event, llm_parsed: Dict) -> Location:
+        return self._location_answer(self._location_input(raw_event), llm_parsed)
+
+    def _location_model(self, raw_event) -> Location:
+        from agents import normalize_location, search_event_location
+
+        llm_input = self._location_input(raw_event)
 
         # Level 1: nano — cheap, fast
         llm_parsed = normalize_location(llm_input)
@@ -162,20 +219,27 @@ class Parser:
         #     llm_parsed = normalize_location(llm_input, model="gpt-4.1-mini")
         #     print(f'[L3 output] {llm_parsed}')
 
-        if not llm_parsed.get('city'):
-            print(f'[no city] {llm_input}')
-            print(f'[no city] {llm_parsed}')
-
-        llm_parsed['location_raw'] = llm_input
-
-        if llm_parsed.get('confidence') in ('medium', 'high'):
-            self._location_cache[llm_input] = llm_parsed
+        return self._location_answer(llm_input, llm_parsed)
 
-        return Location(**llm_parsed)
+    def location(self, raw_event) -> Location:
+        return self._location_local(raw_event) or self._location_model(raw_event)
 
-    def sport(self, raw_event) -> str:
+    def _sport_local(self, raw_event) -> Optional[str]:
         if raw_event.sport:
             return raw_event.sport
+
+        # Level 0: SPORTS lexicon and local model, no model call
+        from sports import classify_local
+        return classify_local(f'{raw_event.title} {raw_event.local}')
+
+    def _sport_request(self, raw_event):
+        from agents import classify_sport
+        return classify_sport, f'{raw_event.title} {raw_event.local}'
+
+    def _sport_result(self, raw_event, result) -> str:
+        return result.sport if result.sport else ''
+
+    def _sport_model(self, raw_event) -> str:
         from agents import classify_sport, search_classify_sport
 
         ## Level 1: nano
@@ -193,25 +257,171 @@ class Parser:
         # result = search_classify_sport(raw_event.title, raw_event.url)
         # print(f'[L3 sport output] {result}')
         # return result.sport.value if result.sport else ''
-        return result.sport if result.sport else ''
+        return self._sport_result(raw_event, result)
 
-    def processed_at(self) -> datetime:
-        return datetime.now()
-
-    def process(self, event_obj: Dict) -> SchemaEvent:
-        event = None
+    def sport(self, raw_event) -> str:
+        return self._sport_local(raw_event) or self._sport_model(raw_event)
+
+    def _event_input(self, raw_event) -> str:
+        return f'Data: {raw_event.date}\nEvento: {raw_event.title}\nLocal: {raw_event.local}'
+
+    def _from_event(self, raw_event, result) -> Dict[str, Any]:
+        """ Fields of a combined normalize_event answer """
+        from sports import CANONICAL
+        llm_input = self._location_input(raw_event)
+        sport = result.sport if result.sport in CANONICAL and result.sport_confidence != 'low' else ''
+        return {
+            'date_range': DateRange(
+                multi_day=result.multi_day,
+                start_date=result.start_date,
+                end_date=result.end_date,
+                date_raw=raw_event.date,
+            ),
+            'location': self._location_answer(llm_input, {
+                'address': result.address,
+                'city': result.city,
+                'uf': result.uf,
+                'confidence': result.location_confidence,
+            }),
+            'sport': sport,
+        }
+
+    def _merge(self, raw_event, fields: Dict[str, Any], result) -> Dict[str, Any]:
+        """ Fill the missing fields from a combined answer """
+        combined = self._from_event(raw_event, result)
+        return fields | {k: combined[k] for k in self.pending(fields)}
+
+    def prepare(self, event_obj: Dict) -> Tuple[RawEvent, Dict[str, Any]]:
+        """ Local pass: every field resolved without a model call, None otherwise """
         raw_event = RawEvent(**event_obj)
         raw_event.validate()
-
-        event = SchemaEvent(
+        return raw_event, {
+            'date_range': self._date_range_local(raw_event),
+            'location': self._location_local(raw_event),
+            'sport': self._sport_local(raw_event),
+        }
+
+    @staticmethod
+    def pending(fields: Dict[str, Any]) -> List[str]:
+        return [k for k, v in fields.items() if v is None]
+
+    def _model_calls(self, raw_event, fields: Dict[str, Any]) -> List[Tuple[Any, str, Callable]]:
+        """ Agent calls still needed, as (agent, prompt, apply(fields, answer))
+
+            One combined normalize_event call when more than one field is
+            missing, otherwise the field's own agent.
+        """
+        pending = self.pending(fields)
+        if len(pending) > 1:
+            from agents import normalize_event
+            return [(normalize_event, self._event_input(raw_event),
+                     lambda f, answer: self._merge(raw_event, f, answer))]
+        return [
+            (*getattr(self, f'_{k}_request')(raw_event),
+             lambda f, answer, k=k: f | {k: getattr(self, f'_{k}_result')(raw_event, answer)})
+            for k in pending
+        ]
+
+    def resolve(self, raw_event, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """ Model pass """
+        for agent, prompt, apply in self._model_calls(raw_event, fields):
+            fields = apply(fields, agent(prompt))
+        return fields
+
+    async def aresolve(self, raw_event, fields: Dict[str, Any]) -> Dict[str, Any]:
+        calls = self._model_calls(raw_event, fields)
+        answers = await asyncio.gather(*(agent.acall(prompt) for agent, prompt, _ in calls))
+        for (_, _, apply), answer in zip(calls, answers):
+            fields = apply(fields, answer)
+        return fields
+
+    def finish(self, raw_event, fields: Dict[str, Any]) -> SchemaEvent:
+        return SchemaEvent(
             title=self.title(raw_event),
-            location=self.location(raw_event),
-            date_range=self.date_range(raw_event),
+            location=fields['location'],
+            date_range=fields['date_range'],
             url=self.url(raw_event),
             source=self.source(raw_event),
             crawled_at=raw_event.crawled_at,
             processed_at=datetime.now(),
-            sport=self.sport(raw_event),
+            sport=fields['sport'],
         )
 
-        return event
+    def processed_at(self) -> datetime:
+        return datetime.now()
+
+    def process(self, event_obj: Dict) -> SchemaEvent:
+        raw_event, fields = self.prepare(event_obj)
+        return self.finish(raw_event, self.resolve(raw_event, fields))
+
+    CONCURRENCY = config('LLM_CONCURRENCY', default=16, cast=int)
+
+    def process_many(self,
+            event_objs: List[Dict],
+            size: int | None = None,
+            concurrency: int | None = None) -> List[SchemaEvent]:
+        """ process() for many events, concurrently over the async client
+
+            Events missing several fields are grouped size at a time into
+            normalize_events requests; the rest, and whatever the batches
+            left out, resolve one by one. At most `concurrency` requests are
+            in flight; llm.limiter keeps them within LLM_RPM / LLM_TPM.
+        """
+        return self.process_prepared([self.prepare(obj) for obj in event_objs], size, concurrency)
+
+    def process_prepared(self,
+            prepared: List[Tuple[RawEvent, Dict[str, Any]]],
+            size: int | None = None,
+            concurrency: int | None = None) -> List[SchemaEvent]:
+        """ process_many() for events already through prepare() """
+        return asyncio.run(self._aprocess_many(list(prepared), size, concurrency))
+
+    async def _aprocess_many(self, prepared, size, concurrency) -> List[SchemaEvent]:
+        from agents import anormalize_events, EVENTS_BATCH_SIZE
+        size = size or EVENTS_BATCH_SIZE
+        in_flight = asyncio.Semaphore(concurrency or self.CONCURRENCY)
+
+        combined = [i for i, (_, fields) in enumerate(prepared) if len(self.pending(fields)) > 1]
+
+        async def batch(chunk):
+            async with in_flight:
+                answers = await anormalize_events([self._event_input(prepared[i][0]) for i in chunk])
+            for i, answer in zip(chunk, answers):
+                if answer is not None:
+                    raw_event, fields = prepared[i]
+                    prepared[i] = (raw_event, self._merge(raw_event, fields, answer))
+
+        async def one(raw_event, fields):
+            async with in_flight:
+                return self.finish(raw_event, await self.aresolve(raw_event, fields))
+
+        await asyncio.gather(*(batch(combined[i:i + size]) for i in range(0, len(combined), size)))
+        return await asyncio.gather(*(one(raw_event, fields) for raw_event, fields in prepared))
+
+    # Nightly: the day's backlog goes to the Batch API; answers land in the LLM cache
+
+    BATCHES = SilverLayer.BASE / 'batches'
+
+    def submit_batch(self, event_objs: List[Dict]) -> Optional[str]:
+        from agents import submit_event_batch
+        contents = {}
+        for obj in event_objs:
+            raw_event, fields = self.prepare(obj)
+            if len(self.pending(fields)) > 1:
+                contents[raw_event.url] = self._event_input(raw_event)
+        batch_id = submit_event_batch(contents)
+        if batch_id:
+            self.BATCHES.mkdir(parents=True, exist_ok=True)
+            (self.BATCHES / f'{batch_id}.json').write_text(json.dumps(contents, ensure_ascii=False))
+        return batch_id
+
+    def collect_batches(self) -> int:
+        """ Cache the answers of finished batch jobs; returns how many were collected """
+        from agents import collect_event_batch
+        count = 0
+        for fn in sorted(self.BATCHES.glob('*.json')) if self.BATCHES.exists() else []:
+            answers = collect_event_batch(fn.stem, json.loads(fn.read_text()))
+            if answers is not None:
+                count += answers
+                fn.unlink()
+        return count
@@ -0,0 +1,137 @@
+import re
+import json
+import math
+from collections import Counter, defaultdict
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from decouple import config
+
+from geo import fold
+
+
+SPORTS = {
+    # Ciclismo
+    'Pedal':                'Ciclismo',
+    'Ciclismo':             'Ciclismo',
+    'Ciclismo de Estrada':  'Ciclismo',
+    # Mountain bike
+    'Mountain bike':        'Mountain bike',
+    'Mountain Bike':        'Mountain bike',
+    'MTB':                  'Mountain bike',
+    'XCM':                  'Mountain bike',
+    'XCO':                  'Mountain bike',
+    # Triathlon
+    'Cross Triathlon':      'Cross Triathlon',
+    'X-Triathlon':          'Cross Triathlon',
+    'Triathlon':            'Triathlon',
+    'Triatlhon':            'Triathlon',
+    'Triatlo':              'Triathlon',
+    'Duathlon':             'Triathlon',
+    'Duatlhon':             'Triathlon',
+    # Natação:
+    'Aquathon':             'Triathlon',
+    'Natação':              'Natação',
+    # Trail running
+    'Trail running':        'Trail running',
+    'Trail Run':            'Trail running',
+    'Corrida Trail':        'Trail running',
+    'Corrida de Montanha':  'Trail running',
+    # Corrida de Rua
+    'Corrida de Rua':       'Corrida de Rua',
+    'Corrida':              'Corrida de Rua',
+    # Cross Duathlon
+    'Cross Duathlon':       'Cross Duathlon',
+    'X-Duathlon':           'Cross Duathlon',
+}
+
+CANONICAL = list(dict.fromkeys(SPORTS.values()))
+
+
+# Longest synonym first: "corrida de montanha" before "corrida"
+_SYNONYMS = {fold(k): v for k, v in SPORTS.items()}
+_LEXICON = re.compile(
+    r'\b(' + '|'.join(re.escape(k) for k in sorted(_SYNONYMS, key=len, reverse=True)) + r')\b')
+
+
+def match_sport(text: str) -> Optional[str]:
+    """ Canonical sport when every SPORTS synonym in the text agrees """
+    found = {_SYNONYMS[m] for m in _LEXICON.findall(fold(text))}
+    return found.pop() if len(found) == 1 else None
+
+
+class SportModel:
+    """ Multinomial Naive Bayes over character n-grams
+
+        Trained offline from labeled schema_events rows
+        (scripts/train_sport_classifier.py), stored as JSON.
+    """
+
+    PATH = Path(__file__).parent / 'data' / 'models' / 'sport_nb.json'
+    NGRAMS = (3, 5)
+    MIN_COUNT = 2
+
+    def __init__(self, counts: Dict[str, Dict[str, int]], docs: Dict[str, int]):
+        self._counts = counts
+        self._docs = docs
+        self._vocab = len({g for c in counts.values() for g in c})
+        total_docs = sum(docs.values())
+        self._prior = {c: math.log(n / total_docs) for c, n in docs.items()}
+        self._total = {c: sum(grams.values()) for c, grams in counts.items()}
+
+    @classmethod
+    def ngrams(klass, text: str) -> Counter:
+        text = f' {fold(text)} '
+        lo, hi = klass.NGRAMS
+        return Counter(text[i:i + n] for n in range(lo, hi + 1) for i in range(len(text) - n + 1))
+
+    @classmethod
+    def train(klass, samples: List[Tuple[str, str]]) -> 'SportModel':
+        counts = defaultdict(Counter)
+        docs = Counter()
+        for text, sport in samples:
+            counts[sport].update(klass.ngrams(text))
+            docs[sport] += 1
+        total = Counter()
+        for grams in counts.values():
+            total.update(grams)
+        keep = {g for g, n in total.items() if n >= klass.MIN_COUNT}
+        return klass({c: {g: n for g, n in grams.items() if g in keep} for c, grams in counts.items()}, dict(docs))
+
+    def predict(self, text: str) -> Tuple[Optional[str], float]:
+        """ (sport, posterior probability) """
+        grams = self.ngrams(text)
+        scores = {}
+        for c, prior in self._prior.items():
+            counts, denom = self._counts[c], self._total[c] + self._vocab
+            scores[c] = prior + sum(n * math.log((counts.get(g, 0) + 1) / denom) for g, n in grams.items())
+        best = max(scores, key=scores.get)
+        norm = sum(math.exp(s - scores[best]) for s in scores.values())
+        return best, 1 / norm
+
+    def save(self, path: Path = PATH) -> Path:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({'counts': self._counts, 'docs': self._docs}, ensure_ascii=False))
+        return path
+
+    @classmethod
+    @lru_cache(maxsize=1)
+    def load(klass) -> Optional['SportModel']:
+        if not klass.PATH.exists():
+            return None
+        return klass(**json.loads(klass.PATH.read_text()))
+
+
+MODEL_THRESHOLD = config('SPORT_MODEL_THRESHOLD', default=0.9, cast=float)
+
+
+def classify_local(text: str) -> Optional[str]:
+    """ Lexicon, then the local model above MODEL_THRESHOLD; None means ask the LLM """
+    if sport := match_sport(text):
+        return sport
+    model = SportModel.load()
+    if model is None:
+        return None
+    sport, p = model.predict(text)
+    return sport if p >= MODEL_THRESHOLD else None
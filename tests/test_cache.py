@@ -0,0 +1,78 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from datetime import date
+from unittest import mock
+
+from bronze import Crawler
+from cache import Manifest
+
+
+class FakeResponse:
+
+    def __init__(self, body):
+        self.status_code, self.content, self.headers = 200, json.dumps(body).encode(), {}
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeCrawler(Crawler):
+    """ Answers {'x': p} for params {'p': p}, counting requests """
+
+    REPO = Path('fake')
+    URL = 'https://example.com/api'
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def _call(self, method_f, endpoint, params={}, payload={}, headers={}):
+        self.calls += 1
+        return FakeResponse({'x': params['p']})
+
+    def trigger(self):
+        return iter(())
+
+
+class RawCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patcher = mock.patch.object(Crawler, 'BASE', Path(tmp.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(Manifest._registry.clear)
+
+    def test_same_suffix_requests_do_not_overwrite_each_other(self):
+        crawler = FakeCrawler()
+        for p in (1, 2, 1, 2):
+            _, data = crawler.get_json(FakeCrawler.URL, suffix='e.json', params={'p': p})
+            self.assertEqual(data, {'x': p})
+        self.assertEqual(crawler.calls, 2)
+
+    def test_replay_serves_each_request_its_own_file(self):
+        crawler = FakeCrawler()
+        for p in (1, 2):
+            crawler.get_json(FakeCrawler.URL, suffix='e.json', params={'p': p})
+        replayed = FakeCrawler()
+        replayed.replay(date.today())
+        for p in (2, 1):
+            _, data = replayed.get_json(FakeCrawler.URL, suffix='e.json', params={'p': p})
+            self.assertEqual(data, {'x': p})
+        self.assertEqual(replayed.calls, 0)
+
+    def test_legacy_names_still_archived(self):
+        raw = FakeCrawler.raw_dir()
+        raw.mkdir(parents=True)
+        (raw / '2025-11-01-e.json').write_text('{"x": 0}')
+        replayed = FakeCrawler()
+        replayed.replay(date(2025, 11, 2))
+        _, data = replayed.get_json(FakeCrawler.URL, suffix='e.json', params={'p': 1})
+        self.assertEqual(data, {'x': 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
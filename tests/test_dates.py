@@ -0,0 +1,60 @@
+import unittest
+from datetime import date
+
+from dates import parse_dates, parse_date
+
+
+D = date
+
+# date_raw -> (start, end), or None when it must be left to the model
+CASES = {
+    # One day
+    '09/11/2025':                               (D(2025, 11, 9), D(2025, 11, 9)),
+    '09/11/25':                                 (D(2025, 11, 9), D(2025, 11, 9)),
+    '09/11/2025 - 08:30':                       (D(2025, 11, 9), D(2025, 11, 9)),
+    '2025-11-09':                               (D(2025, 11, 9), D(2025, 11, 9)),
+    '2025-11-09T08:30:00':                      (D(2025, 11, 9), D(2025, 11, 9)),
+    '09 de Novembro de 2025':                   (D(2025, 11, 9), D(2025, 11, 9)),
+    '9 nov. 2025':                              (D(2025, 11, 9), D(2025, 11, 9)),
+    'Sábado, 09 de novembro de 2025 às 7h':     (D(2025, 11, 9), D(2025, 11, 9)),
+    # Ranges
+    '15 e 16/11/2025':                          (D(2025, 11, 15), D(2025, 11, 16)),
+    '15/11 a 16/11/2025':                       (D(2025, 11, 15), D(2025, 11, 16)),
+    '15 a 17 de novembro de 2025':              (D(2025, 11, 15), D(2025, 11, 17)),
+    '08, 09 e 10 de Novembro de 2025':          (D(2025, 11, 8), D(2025, 11, 10)),
+    'Data: 16/11/2025 até 17/11/2025':          (D(2025, 11, 16), D(2025, 11, 17)),
+    '1 a 3 de março de 2026':                   (D(2026, 3, 1), D(2026, 3, 3)),
+    # Year rollover
+    '30/12 a 02/01/2026':                       (D(2025, 12, 30), D(2026, 1, 2)),
+    '31 de dezembro a 2 de janeiro de 2026':    (D(2025, 12, 31), D(2026, 1, 2)),
+    '28/12/2025 a 03/01/2026':                  (D(2025, 12, 28), D(2026, 1, 3)),
+    # Ambiguous: a stage number as likely as a range start
+    '2 - 15/11/2025':                           None,
+    'Etapa 2 - 15/11/2025':                     None,
+    '15 - 16/11/2025':                          None,
+    # Unrelated dates, too many, too long, backwards, invalid or none
+    'Inscrições até 01/11/2025 - Prova 15/11/2025': None,
+    '01/11/2025, 08/11/2025 e 15/11/2025':      None,
+    '01/10/2025 a 15/11/2025':                  None,
+    '10/11/2025 e 09/11/2025':                  None,
+    '31/02/2025':                               None,
+    'A definir':                                None,
+    '':                                         None,
+}
+
+
+class ParseDatesTest(unittest.TestCase):
+
+    def test_cases(self):
+        for date_raw, expected in CASES.items():
+            with self.subTest(date_raw=date_raw):
+                self.assertEqual(parse_dates(date_raw), expected)
+
+    def test_parse_date_is_the_start(self):
+        for date_raw, expected in CASES.items():
+            with self.subTest(date_raw=date_raw):
+                self.assertEqual(parse_date(date_raw), expected and expected[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
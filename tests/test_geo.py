@@ -0,0 +1,61 @@
+import unittest
+
+from geo import fold, match_location
+
+
+# location_raw -> (city, uf), or None when it must be left to the model
+CASES = {
+    # city/UF, city - UF, city UF
+    'CURVELO/MG':                           ('Curvelo', 'MG'),
+    'curvelo/mg':                           ('Curvelo', 'MG'),
+    'Extrema - MG':                         ('Extrema', 'MG'),
+    'Mairiporã/SP':                         ('Mairiporã', 'SP'),
+    'Mairiporã / SP':                       ('Mairiporã', 'SP'),
+    'campinas-sp':                          ('Campinas', 'SP'),
+    'Salto SP':                             ('Salto', 'SP'),
+    'Brasília DF':                          ('Brasília', 'DF'),
+    'Campinas, SP, Brasil':                 ('Campinas', 'SP'),
+    'Parque Ecológico, Campinas/SP':        ('Campinas', 'SP'),
+    # Longest match: not Lindóia, São Pedro or São João
+    'Águas de Lindóia/SP':                  ('Águas de Lindóia', 'SP'),
+    'Águas de São Pedro - SP':              ('Águas de São Pedro', 'SP'),
+    'Mata de São João - BA':                ('Mata de São João', 'BA'),
+    # Several cities of the state: the one right before the UF
+    'Rua São Paulo, 100 - Campinas/SP':     ('Campinas', 'SP'),
+    # Lower case UF only counts after a separator: "sp" could be anything
+    'salto sp':                             None,
+    # No UF, unknown city, city of another state, two cities
+    'Campinas':                             None,
+    'Cidade Inexistente/SP':                None,
+    'Fazenda Boa Vista - SP':               None,
+    'Curvelo/SP':                           None,
+    'Salto/SP e Itu/SP':                    None,
+    '':                                     None,
+    None:                                   None,
+}
+
+
+class MatchLocationTest(unittest.TestCase):
+
+    def test_cases(self):
+        for location_raw, expected in CASES.items():
+            with self.subTest(location_raw=location_raw):
+                found = match_location(location_raw)
+                self.assertEqual(found and (found['city'], found['uf']), expected)
+
+    def test_match_is_high_confidence_with_ddd(self):
+        self.assertEqual(match_location('CURVELO/MG'), {
+            'address': None, 'city': 'Curvelo', 'uf': 'MG', 'ddd': '38', 'confidence': 'high'})
+
+    def test_fold(self):
+        for text, expected in {
+            'São José dos Campos': 'sao jose dos campos',
+            '  Mairiporã/SP ': 'mairipora sp',
+            'D\'Oeste': 'd oeste',
+        }.items():
+            with self.subTest(text=text):
+                self.assertEqual(fold(text), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import json
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from datetime import datetime
+from unittest import mock
+
+import db
+from bronze import BronzeSink, RawEvent
+from ledger import RunLedger
+
+
+class FakeCrawler:
+    """ Yields `events` events, failing after `fail_after` of them on the first `failures` runs """
+
+    URL = 'https://example.com/'
+    REPO = Path('fake')
+
+    def __init__(self, events=3, fail_after=2, failures=0, site='example.com'):
+        self.events, self.fail_after, self.failures, self.site = events, fail_after, failures, site
+
+    def trigger(self):
+        for i in range(self.events):
+            if self.failures and i == self.fail_after:
+                self.failures -= 1
+                raise ConnectionError('flaky')
+            yield RawEvent(
+                title=f'Evento {i}', local='Campinas/SP', date='09/11/2025',
+                url=f'https://{self.site}/{i}', source='fake',
+                crawled_at=datetime.now(), raw_file=Path('raw.html'))
+
+
+class RunLedgerTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        for target, attr, value in (
+            (RunLedger, 'BASE', self.tmp / 'runs'),
+            (RunLedger, 'BACKOFF', 0),
+            (BronzeSink, 'BASE', self.tmp),
+            (db.Persistence, 'BASE', self.tmp),
+        ):
+            patcher = mock.patch.object(target, attr, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        (self.tmp / FakeCrawler.REPO).mkdir()
+
+    def test_records_path_output(self):
+        ledger = RunLedger()
+        count = ledger.run(FakeCrawler(), lambda crawler: len(list(crawler.trigger())), output=FakeCrawler.REPO)
+        self.assertEqual(count, 3)
+        runs = json.loads(next((self.tmp / 'runs').glob('20*.json')).read_text())
+        self.assertEqual(runs['FakeCrawler'], runs['FakeCrawler'] | {'status': 'done', 'output': 'fake'})
+        self.assertTrue(RunLedger().is_done('FakeCrawler'))
+
+    def test_retry_does_not_duplicate_events(self):
+        with BronzeSink() as sink:
+            count = RunLedger().run(FakeCrawler(failures=1), sink.consume, output=FakeCrawler.REPO)
+        self.assertEqual(count, 3)
+        combined = next(self.tmp.glob('20*-*-[0-9][0-9].jsonl')).read_text().splitlines()
+        self.assertEqual(len(combined), 3)
+        rows = db.Persistence().CONN.execute('SELECT COUNT(*), COUNT(DISTINCT url) FROM raw_events').fetchone()
+        self.assertEqual(rows, (3, 3))
+
+    def test_failure_is_recorded_not_raised(self):
+        count = RunLedger().run(FakeCrawler(failures=5), lambda crawler: len(list(crawler.trigger())))
+        self.assertIsNone(count)
+        runs = json.loads(next((self.tmp / 'runs').glob('20*.json')).read_text())
+        self.assertEqual(runs['FakeCrawler']['status'], 'failed')
+
+    def test_concurrent_consumers_store_every_event(self):
+        crawlers = [FakeCrawler(events=25, site=f'site{n}.com') for n in range(4)]
+        with BronzeSink(batch_size=7) as sink:
+            threads = [threading.Thread(target=sink.consume, args=(c,)) for c in crawlers]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        rows = db.Persistence().CONN.execute('SELECT COUNT(*), COUNT(DISTINCT url) FROM raw_events').fetchone()
+        self.assertEqual(rows, (100, 100))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,7 @@
 
 source .env
 uv run main.py
+uv run main.py --submit-batch # Deferred events, answered by tomorrow's run
 cp data/gold/data.jsonl public/data.jsonl
 
 TODAY=$(date -u +%Y-%m-%d)